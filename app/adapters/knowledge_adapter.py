@@ -1,14 +1,50 @@
-from typing import List, Optional, Type, Dict, Any, Union
+from typing import AsyncIterator, List, Optional, Type, Dict, Any, Union
+
+# Datetime
+from datetime import datetime, timezone
 
 # Beanie Imports
-from beanie import Document, PydanticObjectId, DeleteRules
+from beanie import PydanticObjectId
+from beanie.odm.utils.encoder import Encoder
 
 # Model Imports
-from app.models import KnowledgeBaseDocument, ResourceMetadata, ResourceDocument
+from app.models import KnowledgeBaseDocument, KnowledgeBaseResources, KnowledgeBaseSummary, ResourceMetadata, ResourceDocument, RESOURCE_METADATA_FIELDS
 
 # Import Exceptions
 from app import exceptions
 
+# Adapter Utilities
+from app.adapters.utils import to_object_id
+
+
+def _without_resources(resource_object_ids: List[PydanticObjectId]) -> List[Dict[str, Any]]:
+    """
+    Pipeline update that filters the given resources out of the embedded array server-side.
+    resource_count is recomputed from the filtered array in the same write, which $pull could not do.
+    """
+    return [
+        {"$set": {"resources": {"$filter": {
+            "input": {"$ifNull": ["$resources", []]},
+            "cond": {"$not": [{"$in": ["$$this.resource_id", resource_object_ids]}]}
+        }}}},
+        {"$set": {"resource_count": {"$size": "$resources"}}}
+    ]
+
+
+def _with_resources(encoded_metadata: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Pipeline update that appends the given metadata to the embedded array server-side.
+    resource_count is recomputed from the array rather than incremented, so documents written before it existed are backfilled.
+    """
+    return [
+        {"$set": {"resources": {"$concatArrays": [
+            {"$ifNull": ["$resources", []]},
+            # $literal keeps user supplied values such as names starting with $ from being read as expressions
+            {"$literal": encoded_metadata}
+        ]}}},
+        {"$set": {"resource_count": {"$size": "$resources"}}}
+    ]
+
 
 class KnowledgeBaseAdapter:
     """
@@ -34,28 +70,61 @@ class KnowledgeBaseAdapter:
         if not kb_id:
             raise exceptions.InvalidPathError("The provided KB ID is invalid.")
 
-        kb = await self.kb_model.find_one(self.kb_model.id == kb_id)
+        # Primary key lookup, malformed IDs are rejected before a round trip is spent
+        kb = await self.kb_model.get(to_object_id(kb_id))
         if not kb:
             raise exceptions.KnowledgeBaseNotFound("Knowledge Base not found.")
 
         return kb
 
-    async def get_all_by_user_id(self, user_id: str) -> List[KnowledgeBaseDocument]:
+    async def get_kb_with_resource(self, kb_id: str, resource_id: str) -> KnowledgeBaseDocument:
+        """
+        Retrieve a knowledge base with its resources narrowed to the one matching resource_id, or to none if it is not embedded.
+        An $elemMatch projection does the narrowing, so the rest of the array never leaves the database.
+        The result is partial and must not be cached or saved.
+        """
+        if not kb_id:
+            raise exceptions.InvalidPathError("The provided KB ID is invalid.")
+
+        projection = {field.alias or name: 1 for name, field in self.kb_model.model_fields.items() if name != 'resources'}
+        projection['resources'] = {"$elemMatch": {"resource_id": to_object_id(resource_id)}}
+
+        raw_kb = await self.kb_model.get_motor_collection().find_one({"_id": to_object_id(kb_id)}, projection)
+        if not raw_kb:
+            raise exceptions.KnowledgeBaseNotFound("Knowledge Base not found.")
+
+        return self.kb_model.model_validate(raw_kb)
+
+    async def get_all_by_user_id(self, user_id: str) -> List[KnowledgeBaseSummary]:
         """
         Retrieve all knowledge bases associated with a specific user ID.
+        The embedded resources are left out, use resource_count for their number.
         """
-        all_knowledgebases = await self.kb_model.find(self.kb_model.user_id == PydanticObjectId(user_id)).to_list()
+        all_knowledgebases = await self.kb_model.find(self.kb_model.user_id == to_object_id(user_id), projection_model=KnowledgeBaseSummary).to_list()
         if not all_knowledgebases:
             raise exceptions.KnowledgeBasesForUserNotFound("No Knowledge Bases found for the given user.")
 
         return all_knowledgebases
 
+    def iter_all_by_user_id(self, user_id: str, batch_size: int = 200) -> AsyncIterator[KnowledgeBaseSummary]:
+        """
+        Stream the knowledge bases associated with a specific user ID one document at a time.
+        Only batch_size documents are held by the cursor at once. The ID is validated here, before iteration starts.
+        """
+        return self.kb_model.find(self.kb_model.user_id == to_object_id(user_id), projection_model=KnowledgeBaseSummary, batch_size=batch_size)
+
     async def get_all_resources(self, kb_id: str) -> List[ResourceMetadata]:
         """
         Retrieve all resources associated with a knowledge base ID, returning a list of resource metadata.
         If no resources are found, raises ResourcesForKnowledgeBaseNotFound.
         """
-        kb = await self.get_kb_by_id(kb_id)
+        if not kb_id:
+            raise exceptions.InvalidPathError("The provided KB ID is invalid.")
+
+        # Only project the resources array, the rest of the document is not needed here
+        kb = await self.kb_model.find_one(self.kb_model.id == to_object_id(kb_id), projection_model=KnowledgeBaseResources)
+        if not kb:
+            raise exceptions.KnowledgeBaseNotFound("Knowledge Base not found.")
         if not kb.resources:
             raise exceptions.ResourcesForKnowledgeBaseNotFound("No resources found for the specified knowledge base.")
 
@@ -81,82 +150,128 @@ class KnowledgeBaseAdapter:
     async def update_kb(self, kb_id: str, update_dict: Dict[str, Any]) -> None:
         """
         Update specific fields of a kb based on a provided dictionary.
+        Only the changed fields are sent, as a single $set.
         """
-        kb = await self.get_kb_by_id(kb_id)
+        update_dict = dict(update_dict)
 
         # Perform any necessary validation before updating fields
         if 'name' in update_dict:
             new_name = update_dict['name'].strip()
             if new_name == "":
                 raise exceptions.InvalidNameError("The new name provided is invalid.")
-            kb.name = new_name
+            update_dict['name'] = new_name
 
-        # Update other fields if necessary
-        for key, value in update_dict.items():
-            if key != 'name':  # 'name' is already handled
-                setattr(kb, key, value)
+        kb_object_id = to_object_id(kb_id)
 
         try:
-            await kb.save()
+            result = await self.kb_model.find_one(self.kb_model.id == kb_object_id).update(
+                {"$set": {**update_dict, "date_last_modified": datetime.now(timezone.utc)}}
+            )
         except Exception as e:
             raise exceptions.CannotUpdateKnowledgeBase(f"Failed to update resource for ID {kb_id}: {str(e)}")
 
+        if result.matched_count == 0:
+            raise exceptions.KnowledgeBaseNotFound("Knowledge Base not found.")
+
+    async def patch_embedded_resource(self, kb_id: str, resource_id: str, update_dict: Dict[str, Any]) -> None:
+        """
+        Update fields of one embedded resource's metadata in place with a positional $set.
+        Fields that are not part of the metadata are ignored. The kb is only written when at least one value differs,
+        so a resource missing from the kb or an update that changes nothing is a no-op.
+        """
+        fields = {key: value for key, value in update_dict.items() if key in RESOURCE_METADATA_FIELDS}
+        if not fields:
+            return
+
+        try:
+            await self.kb_model.find_one(
+                self.kb_model.id == to_object_id(kb_id),
+                {"resources": {"$elemMatch": {
+                    "resource_id": to_object_id(resource_id),
+                    "$or": [{key: {"$ne": value}} for key, value in fields.items()]
+                }}}
+            ).update({"$set": {
+                **{f"resources.$.{key}": value for key, value in fields.items()},
+                "date_last_modified": datetime.now(timezone.utc)
+            }})
+        except Exception as e:
+            raise exceptions.CannotUpdateKnowledgeBase(f"Failed to update resource {resource_id} in knowledge base with ID {kb_id}: {str(e)}")
+
     async def add_resources(self, kb_id: str, resources: Union[ResourceDocument, List[ResourceDocument]]) -> None:
         """
         Add one or more resources to a specific knowledge base.
         This method handles both single and multiple resources.
         """
         # Ensure resources is a list even if a single ResourceDocument is provided
-        if not isinstance(resources, list):
+        if type(resources) is not list:
             resources = [resources]
 
-        try:
-            kb = await self.get_kb_by_id(kb_id)
-
-            # Convert each resource document to metadata
-            resource_metadata_list = [res.to_metadata() for res in resources]
-
-            # Initialize resources if it doesn't exist
-            if not hasattr(kb, 'resources') or kb.resources is None:
-                kb.resources = []
-
-            # Append new resource metadata to the existing list
-            kb.resources.extend(resource_metadata_list)
+        kb_object_id = to_object_id(kb_id)
 
-            # Save the knowledge base with the updated resources list
-            await kb.save()
+        try:
+            # Convert each resource document to metadata and append it server-side
+            encoder = Encoder(to_db=True)
+            encoded_metadata = [encoder.encode(res.to_metadata()) for res in resources]
+            result = await self.kb_model.get_motor_collection().update_one(
+                {"_id": kb_object_id},
+                _with_resources(encoded_metadata)
+            )
         except Exception as e:  # Consider catching a more specific exception if possible
             raise exceptions.ResourceAdditionError(f"Failed to add resources to knowledge base with ID {kb_id}: {str(e)}")
 
+        if result.matched_count == 0:
+            raise exceptions.KnowledgeBaseNotFound("Knowledge Base not found.")
+
     async def remove_resources(self, kb_id: str, resource_ids: Union[str, List[str]]) -> None:
         """
         Remove one or more resource's metadata by their IDs from a specific knowledge base.
+        The metadata is filtered server-side so the resources array never leaves the database.
         """
-        if not isinstance(resource_ids, list):
+        if type(resource_ids) is not list:
             resource_ids = [resource_ids]
 
+        kb_object_id = to_object_id(kb_id)
+        resource_object_ids = [to_object_id(resource_id) for resource_id in resource_ids]
+
         try:
-            kb = await self.get_kb_by_id(kb_id)
-            original_length = len(kb.resources)
+            result = await self.kb_model.get_motor_collection().update_one({"_id": kb_object_id}, _without_resources(resource_object_ids))
+        except Exception as e:
+            raise exceptions.KBException(f"Failed to remove resources from knowledge base with ID {kb_id}: {str(e)}")
 
-            kb.resources = [res for res in kb.resources if res.resource_id not in resource_ids]
+        if result.matched_count == 0:
+            raise exceptions.KnowledgeBaseNotFound("Knowledge Base not found.")
+        if result.modified_count == 0:
+            raise exceptions.ResourceDeleteError(f"No resources with the specified IDs were found in the knowledge base with ID {kb_id}.")
 
-            if len(kb.resources) == original_length:
-                raise exceptions.ResourceDeleteError("No resources with the specified IDs were found in the knowledge base with ID {kb_id}.")
+    async def remove_resources_from_all(self, resource_ids: List[str]) -> None:
+        """
+        Remove the metadata of the given resources from every knowledge base that embeds them, in a single update.
+        Resources that are not embedded anywhere are ignored.
+        """
+        resource_object_ids = [to_object_id(resource_id) for resource_id in resource_ids]
+        if not resource_object_ids:
+            return
 
-            await kb.save()
+        try:
+            await self.kb_model.get_motor_collection().update_many(
+                {"resources.resource_id": {"$in": resource_object_ids}},
+                _without_resources(resource_object_ids)
+            )
         except Exception as e:
-            raise exceptions.KBException(f"Failed to remove resources from knowledge base with ID {kb_id}: {str(e)}")
+            raise exceptions.KBException(f"Failed to remove resources {resource_ids} from their knowledge bases: {str(e)}")
 
     # ------------------------------------------------------------------------------------------------------------------------- #
     # Delete Methods
 
     async def delete(self, kb_id: str) -> None:
         """
-        Delete a knowledge base by its ID and all its associated resources. Uses Beanie's DELETE_LINKS rule to ensure all linked resources are also deleted.
+        Delete a knowledge base document by its ID in a single round trip.
+        Resources are embedded as metadata rather than linked, so the resource documents are deleted separately.
         """
         try:
-            kb = await self.get_kb_by_id(kb_id)
-            await kb.delete(link_rule=DeleteRules.DELETE_LINKS)
+            result = await self.kb_model.find_one(self.kb_model.id == to_object_id(kb_id)).delete()
         except Exception as e:
             raise exceptions.KnowledgeBaseDeleteError(f"Failed to delete knowledge base with ID {kb_id}: {str(e)}")
+
+        if not result or result.deleted_count == 0:
+            raise exceptions.KnowledgeBaseNotFound("Knowledge Base not found.")
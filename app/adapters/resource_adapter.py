@@ -1,16 +1,28 @@
-from typing import List, Optional, Type, Dict, Any
+from typing import AsyncIterator, List, Optional, Set, Type, Dict, Any
+
+# Datetime
+from datetime import datetime, timezone
 
 # Beanie Imports
-from beanie import PydanticObjectId
+from beanie import PydanticObjectId, UpdateResponse
+from beanie.operators import In, Or
+
+# Pymongo
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 # Model Imports
-from app.models import ResourceDocument
+from app.models import ResourceDocument, Visibility
 
 # Import Exceptions
 from app import exceptions
 
-# Import Exceptions
-from app import exceptions
+# Adapter Utilities
+from app.adapters.utils import to_object_id
+
+
+# Error code MongoDB reports for a write rejected by a unique index
+DUPLICATE_KEY_ERROR = 11000
 
 
 class ResourceAdapter:
@@ -24,6 +36,10 @@ class ResourceAdapter:
         """
         self.resource_model = resource_model
 
+        # Query field descriptors used on the hot lookup paths
+        self._id_field = resource_model.resource_id
+        self._user_field = resource_model.user_id
+
     # ------------------------------------------------------------------------------------------------------------------------- #
     # Get Methods
 
@@ -31,30 +47,70 @@ class ResourceAdapter:
         """
         Retrieve a single resource by its ID.
         """
-        resource = await self.resource_model.find_one(self.resource_model.resource_id == resource_id)
+        # resource_id is uniquely indexed so this is a single-key lookup
+        resource = await self.resource_model.find_one(self._id_field == to_object_id(resource_id, exceptions.ResourceNotFound))
         if not resource:
             raise exceptions.ResourceNotFound(f"Resource with ID {resource_id} not found.")
         return resource
 
+    async def get_permitted_resources_by_ids(self, resource_ids: List[str], user_id: Optional[str]) -> Dict[str, ResourceDocument]:
+        """
+        Retrieve the resources a user may modify in a single query, keyed by their resource ID.
+        The permission check runs in the query, so forbidden and missing IDs are both absent from the result.
+        """
+        if not resource_ids:
+            return {}
+
+        # Public resources, plus the user's own when the user has a valid ID
+        permitted = self.resource_model.visibility == Visibility.PUBLIC
+        if user_id and PydanticObjectId.is_valid(user_id):
+            permitted = Or(permitted, self._user_field == PydanticObjectId(user_id))
+
+        resources = await self.resource_model.find(
+            In(self._id_field, [to_object_id(resource_id, exceptions.ResourceNotFound) for resource_id in resource_ids]),
+            permitted
+        ).to_list()
+        return {str(resource.resource_id): resource for resource in resources}
+
+    async def get_existing_ids(self, resource_ids: List[str]) -> Set[str]:
+        """
+        Return which of the given resource IDs still exist, reading only the ID of each match.
+        """
+        if not resource_ids:
+            return set()
+
+        cursor = self.resource_model.get_motor_collection().find(
+            {"resource_id": {"$in": [to_object_id(resource_id, exceptions.ResourceNotFound) for resource_id in resource_ids]}},
+            {"resource_id": 1, "_id": 0}
+        )
+        return {str(raw["resource_id"]) async for raw in cursor}
+
     async def get_all_by_user_id(self, user_id: str) -> List[ResourceDocument]:
         """
         Retrieve all resources associated with a specific user ID.
         """
-        resources = await self.resource_model.find(self.resource_model.user_id == user_id).to_list()
+        resources = await self.resource_model.find(self._user_field == to_object_id(user_id, exceptions.ResourceNotFound)).to_list()
         if not resources:
             raise exceptions.ResourceNotFound(f"No resources found for user with ID {user_id}.")
         return resources
 
+    def iter_all_by_user_id(self, user_id: str, batch_size: int = 200) -> AsyncIterator[ResourceDocument]:
+        """
+        Stream the resources associated with a specific user ID one document at a time.
+        Only batch_size documents are held by the cursor at once. The ID is validated here, before iteration starts.
+        """
+        return self.resource_model.find(self._user_field == to_object_id(user_id, exceptions.ResourceNotFound), batch_size=batch_size)
+
     async def get_most_recent(self, user_id: Optional[str] = None, knowledgebase_id: Optional[str] = None, limit: int = 5) -> List[ResourceDocument]:
         """
         Retrieve the most recent resources, optionally filtered by user or knowledge base, limited by a provided count.
         """
         query = {}
         if user_id:
-            query["user_id"] = user_id
+            query["user_id"] = to_object_id(user_id, exceptions.ResourceNotFound)
         if knowledgebase_id:
-            query["knowledgebase_id"] = PydanticObjectId(knowledgebase_id)
-        resources = await self.resource_model.find(query).sort("-date_last_modified").limit(limit).to_list()
+            query["knowledgebase_id"] = to_object_id(knowledgebase_id)
+        resources = await self.resource_model.find(query, batch_size=limit).sort("-date_last_modified").limit(limit).to_list()
         if not resources:
             raise exceptions.ResourceNotFound("No resources found matching the specified criteria.")
         return resources
@@ -73,44 +129,108 @@ class ResourceAdapter:
         except Exception as e:
             raise exceptions.CannotCreateResource(f"Failed to create resource: {str(e)}")
 
+    async def bulk_create(self, create_dicts: List[Dict[str, Any]], skip_duplicates: bool = False) -> List[ResourceDocument]:
+        """
+        Create several resource documents with a single insert_many round trip.
+        With skip_duplicates, documents rejected by a unique index are left out of the result instead of failing the call.
+        """
+        if not create_dicts:
+            return []
+
+        try:
+            resources = [self.resource_model(**create_dict) for create_dict in create_dicts]
+            # insert_many does not write generated IDs back, and a failed batch returns no result, so they are assigned up front
+            for resource in resources:
+                resource.id = PydanticObjectId()
+            await self.resource_model.insert_many(resources, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if not skip_duplicates or any(error.get("code") != DUPLICATE_KEY_ERROR for error in write_errors):
+                raise exceptions.CannotCreateResource(f"Failed to create resources: {str(e)}")
+            rejected = {error["index"] for error in write_errors}
+            return [resource for index, resource in enumerate(resources) if index not in rejected]
+        except Exception as e:
+            raise exceptions.CannotCreateResource(f"Failed to create resources: {str(e)}")
+
+        return resources
+
     # ------------------------------------------------------------------------------------------------------------------------- #
     # Update Method
 
-    async def update_resource(self, resource_id: str, update_dict: Dict[str, Any]) -> None:
+    async def update_resource(self, resource_id: str, update_dict: Dict[str, Any]) -> ResourceDocument:
         """
         Update specific fields of a resource based on a provided dictionary.
+        Only the changed fields are sent, as a single $set, and the updated resource is returned from the same round trip.
         """
-        resource = await self.get_resource_by_id(resource_id)
+        update_dict = dict(update_dict)
 
         # Perform any necessary validation before updating fields
         if 'name' in update_dict:
             new_name = update_dict['name'].strip()
             if new_name == "":
                 raise exceptions.InvalidNameError("The new name provided is invalid.")
-            resource.name = new_name
+            update_dict['name'] = new_name
 
-        # Update other fields if necessary
-        for key, value in update_dict.items():
-            if key != 'name':  # 'name' is already handled
-                setattr(resource, key, value)
+        resource_object_id = to_object_id(resource_id, exceptions.ResourceNotFound)
 
         try:
-            await resource.save()
+            resource = await self.resource_model.find_one(self._id_field == resource_object_id).update(
+                {"$set": {**update_dict, "date_last_modified": datetime.now(timezone.utc)}},
+                response_type=UpdateResponse.NEW_DOCUMENT
+            )
         except Exception as e:
             raise exceptions.CannotUpdateResource(f"Failed to update resource for ID {resource_id}: {str(e)}")
+
+        if resource is None:
+            raise exceptions.ResourceNotFound(f"Resource with ID {resource_id} not found.")
+        return resource
+
+    async def bulk_update(self, updates: Dict[PydanticObjectId, Dict[str, Any]]) -> None:
+        """
+        Update several resources, each with its own fields, in a single bulk_write round trip.
+        """
+        if not updates:
+            return
+
+        now = datetime.now(timezone.utc)
+        operations = [
+            UpdateOne({"resource_id": to_object_id(resource_id, exceptions.ResourceNotFound)}, {"$set": {**update_dict, "date_last_modified": now}})
+            for resource_id, update_dict in updates.items()
+        ]
+
+        try:
+            result = await self.resource_model.get_motor_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            raise exceptions.CannotUpdateResource(f"Failed to update resources: {str(e)}")
+
+        if result.matched_count < len(operations):
+            raise exceptions.ResourceNotFound(f"{len(operations) - result.matched_count} of {len(operations)} resources not found for update.")
+
     # ------------------------------------------------------------------------------------------------------------------------- #
     # Delete Methods
 
-    async def delete_resource(self, resource_id: str) -> None:
+    async def delete_many(self, resource_ids: List[str]) -> int:
         """
-        Delete a resource by its ID.
+        Delete several resources by their IDs in a single round trip, returning how many were deleted.
         """
-        resource = await self.get_resource_by_id(resource_id)
+        if not resource_ids:
+            return 0
+
         try:
-            await resource.delete()
+            result = await self.resource_model.find(In(self._id_field, [to_object_id(resource_id, exceptions.ResourceNotFound) for resource_id in resource_ids])).delete()
         except Exception as e:
-            raise exceptions.CannotDeleteResource(f"Failed to delete resource with ID {resource_id}: {str(e)}")
-        
+            raise exceptions.CannotDeleteResource(f"Failed to delete resources: {str(e)}")
+        return result.deleted_count if result else 0
+
+    async def delete_by_knowledgebase_id(self, knowledgebase_id: str) -> int:
+        """
+        Delete every resource of a knowledge base in a single round trip, returning how many were deleted.
+        """
+        try:
+            result = await self.resource_model.find(self.resource_model.knowledgebase_id == to_object_id(knowledgebase_id)).delete()
+        except Exception as e:
+            raise exceptions.CannotDeleteResource(f"Failed to delete resources of knowledge base with ID {knowledgebase_id}: {str(e)}")
+        return result.deleted_count if result else 0
 
     async def delete_resource(self, resource_id: str) -> None:
         """
@@ -122,5 +242,4 @@ class ResourceAdapter:
         except Exception as e:
             raise exceptions.CannotDeleteResource(f"Failed to delete resource with ID {resource_id}: {str(e)}")
 
-
     # ------------------------------------------------------------------------------------------------------------------------- #
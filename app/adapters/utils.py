@@ -0,0 +1,18 @@
+from typing import Type, Union
+
+# Beanie Imports
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+
+# Import Exceptions
+from app import exceptions
+
+
+def to_object_id(value: Union[str, PydanticObjectId], error: Type[Exception] = exceptions.InvalidPathError) -> PydanticObjectId:
+    """
+    Convert an ID to a PydanticObjectId before it reaches the database, raising the given error if it is malformed.
+    """
+    try:
+        return PydanticObjectId(value)
+    except (InvalidId, TypeError):
+        raise error(f"The provided ID {value} is invalid.")
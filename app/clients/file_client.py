@@ -1,5 +1,6 @@
 # Boto3
 import boto3
+from botocore.config import Config
 import s3fs
 
 # Import configuration
@@ -9,6 +10,15 @@ from app.config import workmait_config
 from abc import ABC, abstractmethod
 
 
+# Shared connection pool and retry policy so concurrent transfers reuse keep-alive connections.
+# The pool covers the upload fan-out (8 files x 8 multipart threads).
+S3_CLIENT_CONFIG = Config(max_pool_connections=64,
+                          retries={'mode': 'adaptive', 'max_attempts': 10},
+                          tcp_keepalive=True,
+                          connect_timeout=3,
+                          read_timeout=30)
+
+
 class RemoteFileServiceClient(ABC):
     """Abstract base class for remote file service clients."""
 
@@ -23,20 +33,24 @@ class RemoteFileServiceClient(ABC):
 
 class S3Client(RemoteFileServiceClient):
     """Manages S3 connections, providing both boto3 resource and s3fs file system."""
+    _session = None
     _resource_instance = None
     _filesystem_instance = None
 
     @classmethod
     def initialize(cls):
         """Initialize the S3 client connections."""
-        # Initialize boto3 resource
-        if cls._resource_instance is None:
-            cls._resource_instance = boto3.resource(
-                's3',
+        # A single session, so endpoint and service models are only loaded once
+        if cls._session is None:
+            cls._session = boto3.Session(
                 aws_access_key_id=workmait_config.AWS_ACCESS_KEY_ID,
                 aws_secret_access_key=workmait_config.AWS_SECRET_ACCESS_KEY
             )
 
+        # Initialize boto3 resource
+        if cls._resource_instance is None:
+            cls._resource_instance = cls._session.resource('s3', config=S3_CLIENT_CONFIG)
+
         # Initialize s3fs filesystem
         if cls._filesystem_instance is None:
             cls._filesystem_instance = s3fs.S3FileSystem(
@@ -17,7 +17,18 @@ class MongoClient:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self, uuid_representation: str = "standard"):
+    def __init__(self,
+                 uuid_representation: str = "standard",
+                 max_pool_size: int = 200,
+                 min_pool_size: int = 20,
+                 max_idle_time_ms: int = 60000,
+                 server_selection_timeout_ms: int = 3000,
+                 compressors: str = "zstd,zlib",
+                 zlib_compression_level: int = 6):
+
+        # Ensure initialization only happens once, __new__ hands back the same instance
+        if hasattr(self, 'initialized'):
+            return
 
         # check UUID representation
         if uuid_representation != "standard":
@@ -26,8 +37,19 @@ class MongoClient:
         # Mongo connection string
         self.mongo_connection_str = workmait_config.MONGO_CONNECTION_STR
 
-        # Initialize the MongoDB client
-        self.client = motor.motor_asyncio.AsyncIOMotorClient(self.mongo_connection_str, uuidRepresentation=uuid_representation)
+        # Initialize the MongoDB client with a connection pool sized for concurrent requests.
+        # Wire compression is negotiated with the server, the first mutually supported compressor wins.
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(self.mongo_connection_str,
+                                                             uuidRepresentation=uuid_representation,
+                                                             maxPoolSize=max_pool_size,
+                                                             minPoolSize=min_pool_size,
+                                                             maxIdleTimeMS=max_idle_time_ms,
+                                                             serverSelectionTimeoutMS=server_selection_timeout_ms,
+                                                             compressors=compressors,
+                                                             zlibCompressionLevel=zlib_compression_level)
+
+        # set the initialized flag to True
+        self.initialized = True
 
     @staticmethod
     def get_connection():
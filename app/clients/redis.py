@@ -1,13 +1,14 @@
 # Typing imports
-from typing import Callable, Dict, Type
+from typing import Any, Callable, Dict, List, Type, Union
 
 
 # Redis imports
-import redis
+import redis.asyncio
 import redis.exceptions
 
 import logging
 import asyncio
+import orjson
 from pydantic import BaseModel
 
 
@@ -26,23 +27,23 @@ class RedisClient:
         """
         if not hasattr(self, 'initialized'):
             # Ensure initialization only happens once
-            self.redis = redis.Redis(host=host, port=port, db=db)
+            self.redis = redis.asyncio.Redis(host=host, port=port, db=db)
             self.streams = {}
             # set the initialized flag to True
             self.initialized = True
 
-    def create_consumer_group(self, event_name: str, group_name: str) -> None:
+    async def create_consumer_group(self, event_name: str, group_name: str) -> None:
         """
         Create a consumer group for a given Redis stream.
         """
         try:
             # Create a group with the event name as the key and a group name
-            self.redis.xgroup_create(name=event_name, groupname=group_name, mkstream=True)
+            await self.redis.xgroup_create(name=event_name, groupname=group_name, mkstream=True)
             logging.info(f"Created consumer group '{group_name}' for event '{event_name}'")
         except redis.exceptions.ResponseError as e:
             logging.info(f"Consumer group '{group_name}' already exists or other error: {e}")
 
-    def register_event(self, event_name: str, group_name: str) -> None:
+    async def register_event(self, event_name: str, group_name: str) -> None:
         """
         Register an event with a consumer group.
         """
@@ -51,19 +52,44 @@ class RedisClient:
         self.streams[event_name] = group_name
 
         # Create the consumer group
-        self.create_consumer_group(event_name=event_name, group_name=group_name)
+        await self.create_consumer_group(event_name=event_name, group_name=group_name)
 
-    def produce_event(self, event_name: str, event_payload: BaseModel) -> None:
+    @staticmethod
+    def encode_event_field(value: Any) -> Union[bytes, int, float]:
+        """
+        Encode a single stream field. Strings are UTF-8 encoded, numbers pass through and anything else (lists, nested models) is serialized to JSON bytes.
+        """
+        if isinstance(value, str):
+            return value.encode('utf-8')
+        if isinstance(value, (bytes, int, float)) and not isinstance(value, bool):
+            return value
+        return orjson.dumps(value)
+
+    @classmethod
+    def encode_event_payload(cls, event_payload: BaseModel) -> Dict:
+        """
+        Encode an event payload into stream fields.
+        """
+        return {k: cls.encode_event_field(v) for k, v in event_payload.model_dump(mode='json').items()}
+
+    async def produce_event(self, event_name: str, event_payload: BaseModel) -> None:
         """
         Produce an event to a specified Redis stream. This takes in an event payload which is a BaseModel via Pydantic.
         """
+        await self.produce_events(event_name, [event_payload])
+
+    async def produce_events(self, event_name: str, event_payloads: List[BaseModel]) -> None:
+        """
+        Produce several events to a specified Redis stream. The XADDs are pipelined so they cost a single round-trip.
+        """
+        if not event_payloads:
+            return
         try:
-            # Event Payload transformed into a dictionary
-            event_payload_dict = event_payload.model_dump()
-            # Encode it as UTF-8 if its a string. TODO: Add support for flattening nested base models.
-            encoded_event_payload = {k: v.encode('utf-8') if isinstance(v, str) else v for k, v in event_payload_dict.items()}
-            self.redis.xadd(name=event_name, fields=encoded_event_payload)
-            logging.info(f"Added the following event payload: {encoded_event_payload} to event '{event_name}'")
+            pipe = self.redis.pipeline(transaction=False)
+            for event_payload in event_payloads:
+                pipe.xadd(name=event_name, fields=self.encode_event_payload(event_payload))
+            await pipe.execute()
+            logging.info(f"Added {len(event_payloads)} event payload(s) to event '{event_name}'")
         except Exception as e:
             logging.error(f"Error producing message: {e}")
 
@@ -72,7 +98,7 @@ class RedisClient:
         while True:
             try:
                 # Process events
-                events = self.redis.xreadgroup(groupname=group_name, consumername=consumer_name, streams={event_name: '>'}, count=1)
+                events = await self.redis.xreadgroup(groupname=group_name, consumername=consumer_name, streams={event_name: '>'}, count=1)
                 if events:
                     for _, event_payload in events:
                         for event_id, event in event_payload:
@@ -84,7 +110,7 @@ class RedisClient:
                             callback(event)
 
                             # Acknowledge event processing
-                            self.redis.xack(event_name, group_name, event_id)
+                            await self.redis.xack(event_name, group_name, event_id)
             except Exception as e:
                 logging.error(e)
             await asyncio.sleep(1)  # Sleep for a short period to avoid tight loop
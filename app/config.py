@@ -1,29 +1,38 @@
-# Load Environment variables
-import os
-from dotenv import load_dotenv
+# Typing
+from typing import Optional
+from functools import lru_cache
 
-# Pydantic
-from pydantic import BaseModel
+# Pydantic Settings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-# Load the environment variables
-load_dotenv()
 
-
-class WorkmaitConfig(BaseModel):
+class WorkmaitConfig(BaseSettings):
+    """
+    Service configuration, read once from the environment and the .env file.
+    """
+    model_config = SettingsConfigDict(env_file=".env", frozen=True, extra="ignore")
 
     # MongoDB
-    MONGO_CONNECTION_STR: str = os.getenv('MONGO_CONNECTION_STR')
+    MONGO_CONNECTION_STR: str
 
     # SECRET
     SECRET: str = ""
 
     # OpenAI API KEY
-    OPENAI_API_KEY: str = os.getenv('OPENAI_API_KEY')
+    OPENAI_API_KEY: Optional[str] = None
 
     # Boto3
-    AWS_ACCESS_KEY_ID: str = os.getenv('AWS_ACCESS_KEY_ID')
-    AWS_SECRET_ACCESS_KEY: str = os.getenv('AWS_SECRET_ACCESS_KEY')
+    AWS_ACCESS_KEY_ID: Optional[str] = None
+    AWS_SECRET_ACCESS_KEY: Optional[str] = None
+
+
+@lru_cache(maxsize=1)
+def get_config() -> WorkmaitConfig:
+    """
+    Return the process-wide config instance.
+    """
+    return WorkmaitConfig()
 
 
 # Instance of config
-workmait_config = WorkmaitConfig()
+workmait_config = get_config()
@@ -137,3 +137,7 @@ class RemoteFileManagerMoveError(RemoteFileManagerException):
 
 class RemoteFileManagerDeleteError(RemoteFileManagerException):
     pass
+
+
+class RemoteFileManagerListError(RemoteFileManagerException):
+    pass
@@ -1,20 +1,50 @@
-from typing import Optional
+from typing import NamedTuple, Optional
+from functools import lru_cache
+import asyncio
+import hashlib
+import time
+
+# Caching
+from cachetools import TLRUCache, TTLCache
 
 # FastAPI
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import Depends, HTTPException, status, Response
 
 # Firebase
-from firebase_admin import auth, credentials, initialize_app, firestore
+from firebase_admin import App, auth, credentials, initialize_app, firestore
 
 # Pydantic
 from pydantic import BaseModel
 
-credential = credentials.Certificate(cert='key.json')
-initialize_app(credential=credential)
 
-# Initialize Firestore client
-db = firestore.client()
+@lru_cache(maxsize=1)
+def get_firebase_app() -> App:
+    """
+    Initialize the Firebase app on first use rather than at import time.
+    """
+    return initialize_app(credential=credentials.Certificate(cert='key.json'))
+
+
+@lru_cache(maxsize=1)
+def get_firestore_db():
+    """
+    Initialize the Firestore client on first use rather than at import time.
+    """
+    return firestore.client(app=get_firebase_app())
+
+
+# Profiles are cached briefly so repeat requests from a user skip Firestore
+USER_PROFILE_CACHE_TTL_SECONDS = 60
+user_profile_cache: TTLCache = TTLCache(maxsize=10_000, ttl=USER_PROFILE_CACHE_TTL_SECONDS)
+
+# Resolved users are cached by token digest for a few minutes, and never past the token's expiry
+CURRENT_USER_CACHE_TTL_SECONDS = 300
+current_user_cache: TLRUCache = TLRUCache(
+    maxsize=10_000,
+    ttu=lambda _key, current_user, now: min(now + CURRENT_USER_CACHE_TTL_SECONDS, current_user.expires_at),
+    timer=time.time
+)
 
 
 ROLE_HIERARCHY = {
@@ -31,25 +61,77 @@ class BaseUser(BaseModel):
     role: str
 
 
-def fetch_user_profile(user_id: str) -> BaseUser:
+class CurrentUser(NamedTuple):
+    user: BaseUser
+    role_level: int
+    expires_at: float
+
+
+async def fetch_user_profile(user_id: str) -> BaseUser:
+    user_profile = user_profile_cache.get(user_id)
+    if user_profile is not None:
+        return user_profile
+
     try:
-        doc_ref = db.collection('users').document(user_id)
-        doc = doc_ref.get()
+        doc_ref = get_firestore_db().collection('users').document(user_id)
+        # The Firestore client is blocking, keep it off the event loop
+        doc = await asyncio.to_thread(doc_ref.get)
         if not doc.exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"User profile not found for user_id: {user_id}",
             )
         data = doc.to_dict()
-        return BaseUser(id=user_id, **data)
+        user_profile = BaseUser(id=user_id, **data)
+    except HTTPException:
+        raise
     except Exception as err:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching user profile: {err}",
         )
 
+    user_profile_cache[user_id] = user_profile
+    return user_profile
+
+
+async def verify_id_token(id_token: str) -> dict:
+    # Verification is CPU bound and may fetch the signing keys, keep it off the event loop
+    return await asyncio.to_thread(auth.verify_id_token, id_token, app=get_firebase_app())
+
+
+async def resolve_current_user(id_token: str) -> CurrentUser:
+    # Keyed on the digest so raw tokens are never retained
+    token_digest = hashlib.sha256(id_token.encode()).digest()
+    current_user = current_user_cache.get(token_digest)
+    if current_user is not None:
+        return current_user
+
+    try:
+        decoded_token = await verify_id_token(id_token)
+    except Exception as err:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid authentication from Firebase. {err}",
+            headers={'WWW-Authenticate': 'Bearer error="invalid_token"'},
+        )
+
+    user_profile = await fetch_user_profile(decoded_token.get('uid'))
+
+    # Prefer the role_level custom claim when the auth server sets it
+    role_level = decoded_token.get('role_level')
+    if role_level is None:
+        role_level = ROLE_HIERARCHY.get(decoded_token.get('role'), 0)
+
+    current_user = CurrentUser(user=user_profile, role_level=role_level, expires_at=decoded_token['exp'])
+    current_user_cache[token_digest] = current_user
+    return current_user
+
 
 def get_current_user(required_role: Optional[str] = None):
+    # The required level is fixed for this dependency, resolve it once
+    required_role_level = ROLE_HIERARCHY.get(required_role, 0) if required_role else 0
+
     async def _get_current_user(
         res: Response, credential: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False))
     ):
@@ -59,34 +141,19 @@ def get_current_user(required_role: Optional[str] = None):
                 detail="Bearer authentication is needed",
                 headers={'WWW-Authenticate': 'Bearer realm="auth_required"'},
             )
-        try:
-            decoded_token = auth.verify_id_token(credential.credentials)
-        except Exception as err:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=f"Invalid authentication from Firebase. {err}",
-                headers={'WWW-Authenticate': 'Bearer error="invalid_token"'},
-            )
+        current_user = await resolve_current_user(credential.credentials)
 
         res.headers['WWW-Authenticate'] = 'Bearer realm="auth_required"'
 
-        user_role = decoded_token.get('role')
-        user_id = decoded_token.get('uid')
-
-        user_profile = fetch_user_profile(user_id)
-
         # Check role hierarchy
-        if required_role:
-            user_role_level = ROLE_HIERARCHY.get(user_role, 0)
-            required_role_level = ROLE_HIERARCHY.get(required_role, 0)
-            if user_role_level < required_role_level:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail=f"User does not have the required role: {required_role}",
-                )
+        if required_role and current_user.role_level < required_role_level:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"User does not have the required role: {required_role}",
+            )
 
         # return user_id
-        return user_profile
+        return current_user.user
 
     return _get_current_user
 
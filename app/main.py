@@ -16,6 +16,11 @@ from app.models import ResourceDocument, KnowledgeBaseDocument
 # Import the S3 service
 from app.services import S3Service
 
+# Per-request document identity map
+from app.services.cache import request_scope
+from app.services.file_service import S3_EXECUTOR
+from app.services.knowledge_service import drain_background_tasks
+
 # Import the Mongo Client
 from app.clients import MongoClient
 
@@ -43,6 +48,12 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    # Finish deferred cleanup first, it may still need the S3 executor
+    await drain_background_tasks()
+
+    # Let in-flight S3 calls finish before the process exits
+    S3_EXECUTOR.shutdown(wait=True)
+
 # Main Application
 app = FastAPI(lifespan=lifespan)
 
@@ -55,6 +66,16 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+
+@app.middleware("http")
+async def document_identity_map(request: Request, call_next):
+    """
+    Scope document lookups to the request, so a document read twice in one request is fetched once.
+    """
+    with request_scope():
+        return await call_next(request)
+
+
 # Include the knowledgebase router
 app.include_router(knowledgebase_router, prefix="/knowledgebase", tags=["knowledgebase"])
 
@@ -1,10 +1,13 @@
-from app.models.knowledge import ResourceDocument, ResourceMetadata, KnowledgeBaseDocument, Visibility
+from app.models.knowledge import ResourceDocument, ResourceMetadata, RESOURCE_METADATA_FIELDS, KnowledgeBaseDocument, KnowledgeBaseResources, KnowledgeBaseSummary, Visibility
 
 
 __all__ = [
 
     "KnowledgeBaseDocument",
+    "KnowledgeBaseResources",
+    "KnowledgeBaseSummary",
     "ResourceDocument",
     "ResourceMetadata",
+    "RESOURCE_METADATA_FIELDS",
     "Visibility"
 ]
@@ -3,6 +3,7 @@ from typing import Optional, List
 
 # Datetime
 from datetime import datetime, timezone
+from functools import partial
 
 # Pydantic
 from pydantic import BaseModel, Field, field_validator, HttpUrl
@@ -17,6 +18,10 @@ from beanie.odm.fields import PydanticObjectId
 from enum import Enum
 
 
+# Factory for timezone-aware UTC timestamps
+_utcnow = partial(datetime.now, timezone.utc)
+
+
 class Visibility(str, Enum):
     PUBLIC = "public"
     PRIVATE = "private"
@@ -38,12 +43,23 @@ class KnowledgeBaseDocument(Document):
 
     # Resources payload and Resources
     resources: Optional[List["ResourceMetadata"]] = Field(default_factory=list, description="Where resource metadata is stored.")
+    resource_count: int = Field(default=0, description="Number of entries in resources, kept in step with every resources update.")
 
     # Date info
-    date_created: datetime = Field(
-        default_factory=lambda: datetime.now(timezone.utc))
-    date_last_modified: datetime = Field(
-        default_factory=lambda: datetime.now(timezone.utc))
+    date_created: datetime = Field(default_factory=_utcnow)
+    date_last_modified: datetime = Field(default_factory=_utcnow)
+
+    @property
+    def is_public(self) -> bool:
+        # Enum members are singletons, so an identity check is enough
+        return self.visibility is Visibility.PUBLIC
+
+    def get_resource(self, resource_id: str) -> Optional["ResourceMetadata"]:
+        """
+        Return the embedded metadata of a resource, or None if it is not in this knowledge base.
+        """
+        resource_id = str(resource_id)
+        return next((resource for resource in self.resources or [] if str(resource.resource_id) == resource_id), None)
 
     class Settings:
         name = "knowledge_bases"
@@ -54,6 +70,20 @@ class KnowledgeBaseDocument(Document):
         ]
 
 
+class KnowledgeBaseSummary(BaseModel):
+    """
+    Projection of a knowledge base without its embedded resource metadata.
+    """
+    id: PydanticObjectId = Field(alias="_id")
+    name: str
+    user_id: PydanticObjectId
+    visibility: Visibility = Visibility.PRIVATE
+    remote_dir: Optional[str] = None
+    resource_count: int = 0
+    date_created: datetime
+    date_last_modified: datetime
+
+
 # ------------------------------------------------------------------------------------------------------------------------- #
 # ------------------------------------------------------------------------------------------------------------------------- #
 #  ResourceDocument
@@ -67,6 +97,17 @@ class ResourceMetadata(BaseModel):
     in_vector_store: bool = False
 
 
+# Fields of a resource that are mirrored onto its embedded metadata in the knowledge base
+RESOURCE_METADATA_FIELDS = frozenset(ResourceMetadata.model_fields)
+
+
+class KnowledgeBaseResources(BaseModel):
+    """
+    Projection of a knowledge base that only carries its resource metadata.
+    """
+    resources: Optional[List[ResourceMetadata]] = Field(default_factory=list)
+
+
 class ResourceDocument(Document):
     resource_id: PydanticObjectId = Field(default_factory=PydanticObjectId)
     name: str
@@ -90,29 +131,32 @@ class ResourceDocument(Document):
     num_docs: Optional[int] = None
 
     # Date info
-    date_created: datetime = Field(
-        default_factory=lambda: datetime.now(timezone.utc))
-    date_last_modified: datetime = Field(
-        default_factory=lambda: datetime.now(timezone.utc))
+    date_created: datetime = Field(default_factory=_utcnow)
+    date_last_modified: datetime = Field(default_factory=_utcnow)
+
+    @property
+    def is_public(self) -> bool:
+        return self.visibility is Visibility.PUBLIC
 
     class Settings:
         name = "resources"
         is_root = True
         indexes = [
-            IndexModel("user_id", unique=False),
-            IndexModel([("knowledgebase_id", pyASCENDING)],
-                       name="knowledgebase_id_index"),
+            IndexModel("resource_id", unique=True),
+            IndexModel([("user_id", pyASCENDING), ("date_last_modified", pyDESCENDING)],
+                       name="user_id_date_last_modified_index"),
+            IndexModel([("knowledgebase_id", pyASCENDING), ("date_last_modified", pyDESCENDING)],
+                       name="knowledgebase_id_date_last_modified_index"),
+            # One resource per file in a knowledge base, so registering uploaded files twice cannot duplicate them
+            IndexModel([("knowledgebase_id", pyASCENDING), ("remote_file_key", pyASCENDING)],
+                       name="knowledgebase_id_remote_file_key_index", unique=True,
+                       partialFilterExpression={"remote_file_key": {"$type": "string"}}),
             IndexModel([("date_last_modified", pyDESCENDING)])
         ]
 
     def to_metadata(self) -> ResourceMetadata:
         """
         Function to return the resource metadata quickly.
+        The fields were already validated on this document, so validation is skipped.
         """
-        return ResourceMetadata(resource_id=str(self.resource_id),
-                                name=self.name,
-                                remote_file_key=self.remote_file_key,
-                                preview_image_url=self.preview_image_url if self.preview_image_url else None,
-                                resource_type=self.resource_type if self.resource_type else None,
-                                in_vector_store=self.in_vector_store if self.in_vector_store else False
-                                )
+        return ResourceMetadata.model_construct(**{field: getattr(self, field) for field in ResourceMetadata.model_fields})
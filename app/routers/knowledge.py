@@ -1,7 +1,8 @@
 # knowledgebase_router.py
 
-from typing import Annotated, List, Optional
+from typing import Annotated, AsyncIterator, List, Optional
 from fastapi import APIRouter, BackgroundTasks, Depends, File, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 # Import services
@@ -20,12 +21,16 @@ from app.schemas import (
 
     # KB Requests
     CreateKnowledgebaseRequest,
-    AddResourcesRequest,
+    InitKnowledgebaseUploadRequest,
+    CommitKnowledgebaseUploadRequest,
     DeleteResourcesRequest,
     ShareKnowledgebaseRequest,
     RenameFileRequest,
     RenameKnowledgebaseRequest,
 
+    # Upload Summaries
+    UploadSummary,
+
     # Redis Events
     ToLlamaDocsEventPayload
 )
@@ -35,11 +40,30 @@ from app.schemas import (
 router = APIRouter()
 
 
-def to_llama_docs_fn(to_llama_docs_payload: ToLlamaDocsEventPayload, redis_client: RedisClient):
+async def to_llama_docs_fn(to_llama_docs_payload: ToLlamaDocsEventPayload, redis_client: RedisClient):
     """
     Function to produce the TO_LLAMA_DOCS event.
     """
-    redis_client.produce_event('TO_LLAMA_DOCS', to_llama_docs_payload)
+    await redis_client.produce_event('TO_LLAMA_DOCS', to_llama_docs_payload)
+
+
+def schedule_to_llama_docs(background_tasks: BackgroundTasks, redis_client: RedisClient, upload_summary: UploadSummary) -> None:
+    """
+    Schedule the TO_LLAMA_DOCS event for the distinct file keys of the successful uploads, skipping it when there are none.
+    """
+    # dict.fromkeys drops repeated keys while keeping their order
+    remote_file_keys = list(dict.fromkeys(success.resource.remote_file_key for success in upload_summary.successes if success.resource.remote_file_key))
+    if not remote_file_keys:
+        return
+    background_tasks.add_task(to_llama_docs_fn, ToLlamaDocsEventPayload.model_construct(remote_file_keys=remote_file_keys), redis_client)
+
+
+async def to_ndjson(documents: AsyncIterator[BaseModel]) -> AsyncIterator[str]:
+    """
+    Serialize documents one at a time as newline-delimited JSON.
+    """
+    async for document in documents:
+        yield document.model_dump_json() + "\n"
 
 # --------------------------------------------------------------------------------------------------------------------------------------------------- #
 # --------------------------------------------------------------------------------------------------------------------------------------------------- #
@@ -52,7 +76,8 @@ async def create_knowledgebase(
     app_service: Annotated[AppService, Depends(get_app_service)],
     redis_client: Annotated[RedisClient, Depends(get_redis_client)],
     background_tasks: BackgroundTasks,
-    request_payload: CreateKnowledgebaseRequest,
+    request_payload: Annotated[CreateKnowledgebaseRequest, Depends(CreateKnowledgebaseRequest.as_form)],
+    files: Annotated[List[UploadFile], File(description="List of files to be uploaded")],
     user: Annotated[Optional[BaseUser], Depends(get_current_user_no_role)]
 ):
     """
@@ -65,21 +90,65 @@ async def create_knowledgebase(
 
     # Call the Function
     upload_summary = await app_service.create_knowledgebase(
-        files=request_payload.files,
+        files=files,
         name=request_payload.name,
         visibility=request_payload.visibility,
         user_id=user_id
     )
 
-    # Get all of the file keys of the successful uploads
-    remote_file_keys = [success.resource.remote_file_key for success in upload_summary.successes]
-    to_llama_docs_payload = ToLlamaDocsEventPayload(remote_file_keys=remote_file_keys)
-
-    # BackgroundTasks creates a separate thread --> Callable interface
-    background_tasks.add_task(to_llama_docs_fn, to_llama_docs_payload, redis_client)
+    # Async background tasks are awaited on the event loop after the response is sent
+    schedule_to_llama_docs(background_tasks, redis_client, upload_summary)
 
     return {"message": "Knowledgebase creation initiated", "upload_summary": upload_summary}
 
+# --------------------------------------------------------------------------------------------------------------------------------------------------- #
+# --------------------------------------------------------------------------------------------------------------------------------------------------- #
+# Direct Upload Routes
+
+
+@router.post("/create/init")
+async def init_knowledgebase_upload(
+    app_service: Annotated[AppService, Depends(get_app_service)],
+    request_payload: InitKnowledgebaseUploadRequest,
+    user: Annotated[Optional[BaseUser], Depends(get_current_user_no_role())]
+):
+    """
+    Endpoint to create a knowledgebase and get presigned POSTs so the client uploads its files straight to the file store.
+    """
+    user_id = user.id if user else None
+
+    if not user_id and request_payload.visibility == 'private':
+        raise HTTPException(status_code=400, detail="Cannot create a private kb for a non-authenticated user.")
+
+    return await app_service.init_knowledgebase_upload(
+        name=request_payload.name,
+        file_names=request_payload.file_names,
+        visibility=request_payload.visibility,
+        user_id=user_id
+    )
+
+
+@router.post("/create/commit")
+async def commit_knowledgebase_upload(
+    app_service: Annotated[AppService, Depends(get_app_service)],
+    redis_client: Annotated[RedisClient, Depends(get_redis_client)],
+    background_tasks: BackgroundTasks,
+    request_payload: CommitKnowledgebaseUploadRequest,
+    user: Annotated[Optional[BaseUser], Depends(get_current_user_no_role())]
+):
+    """
+    Endpoint to register the files a client uploaded directly and start processing them.
+    """
+    upload_summary = await app_service.commit_knowledgebase_upload(
+        kb_id=request_payload.kb_id,
+        user_id=user.id if user else None
+    )
+
+    # Async background tasks are awaited on the event loop after the response is sent
+    schedule_to_llama_docs(background_tasks, redis_client, upload_summary)
+
+    return {"message": "Knowledgebase upload committed", "upload_summary": upload_summary}
+
 # --------------------------------------------------------------------------------------------------------------------------------------------------- #
 # --------------------------------------------------------------------------------------------------------------------------------------------------- #
 # Add Resources Routeƒ
@@ -93,19 +162,45 @@ async def add_resources(
     app_service: Annotated[AppService, Depends(get_app_service)],
     redis_client: Annotated[RedisClient, Depends(get_redis_client)],
     background_tasks: BackgroundTasks,
-    request_payload: AddResourcesRequest,
+    files: Annotated[List[UploadFile], File(description="List of files to be added")],
     user: Annotated[Optional[BaseUser], Depends(get_current_user_no_role)]
 ):
     upload_summary = await app_service.add_resources(
         kb_id=kb_id,
-        files=request_payload.files,
+        files=files,
         user_id=user.id if user else None
     )
 
-    remote_file_keys = [success.resource.remote_file_key for success in upload_summary.successes]
-    to_llama_docs_payload = ToLlamaDocsEventPayload(remote_file_keys=remote_file_keys)
-
-    # BackgroundTasks creates a separate thread --> Callable interface
-    background_tasks.add_task(to_llama_docs_fn, to_llama_docs_payload, redis_client)
+    # Async background tasks are awaited on the event loop after the response is sent
+    schedule_to_llama_docs(background_tasks, redis_client, upload_summary)
 
     return {"message": "Resources added successfully", "upload_summary": upload_summary}
+
+# --------------------------------------------------------------------------------------------------------------------------------------------------- #
+# --------------------------------------------------------------------------------------------------------------------------------------------------- #
+# List Routes
+
+
+@router.get("/all")
+async def list_knowledgebases(
+    app_service: Annotated[AppService, Depends(get_app_service)],
+    user: Annotated[BaseUser, Depends(get_current_user_no_role())]
+):
+    """
+    Endpoint to stream the knowledgebases of the current user as newline-delimited JSON.
+    """
+    # Awaited before the response is built, so a bad ID or a failed query still gets an error status
+    knowledgebases = await app_service.stream_knowledgebases(user.id)
+    return StreamingResponse(to_ndjson(knowledgebases), media_type="application/x-ndjson")
+
+
+@router.get("/resources")
+async def list_resources(
+    app_service: Annotated[AppService, Depends(get_app_service)],
+    user: Annotated[BaseUser, Depends(get_current_user_no_role())]
+):
+    """
+    Endpoint to stream the resources of the current user as newline-delimited JSON.
+    """
+    resources = await app_service.stream_resources(user.id)
+    return StreamingResponse(to_ndjson(resources), media_type="application/x-ndjson")
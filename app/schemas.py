@@ -1,9 +1,9 @@
 # Typing Imports
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 # Pydantic
-from pydantic import BaseModel, Field
-from fastapi import UploadFile, File
+from pydantic import BaseModel, ConfigDict, Field
+from fastapi import Form
 
 
 # Resource Document
@@ -16,32 +16,74 @@ from app.models import ResourceDocument, Visibility
 
 
 class FileUploadError(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     filename: str
     error_message: Optional[str]
 
 
 class FileUploadSuccess(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     filename: str
     resource: ResourceDocument
 
 
 class UploadSummary(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     successes: List[FileUploadSuccess]
     errors: List[FileUploadError]
 
 
+# Direct Upload Schemas
+# --------------------------------------------------------------------------------------------------------------------------------------------------- #
+# --------------------------------------------------------------------------------------------------------------------------------------------------- #
+
+
+class PresignedUpload(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    file_name: str
+    file_key: str
+    url: str
+    fields: Dict[str, str]
+
+
+class DirectUploadInit(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    kb_id: str
+    uploads: List[PresignedUpload]
+
+
 # KnowledgeBase Request Schemas
 # --------------------------------------------------------------------------------------------------------------------------------------------------- #
 # --------------------------------------------------------------------------------------------------------------------------------------------------- #
 
 class CreateKnowledgebaseRequest(BaseModel):
     name: str = Field(..., description="The name of the knowledgebase")
-    files: List[UploadFile] = Field(..., description="List of files to be uploaded")
+    visibility: Visibility = Field(default=Visibility.PRIVATE, description="Visibility of the knowledge base, can be 'public' or 'private'")
+
+    @classmethod
+    def as_form(cls,
+                name: str = Form(..., description="The name of the knowledgebase"),
+                visibility: Visibility = Form(default=Visibility.PRIVATE, description="Visibility of the knowledge base, can be 'public' or 'private'")
+                ) -> "CreateKnowledgebaseRequest":
+        """
+        Read the request from multipart form fields, so it can be sent alongside the uploaded files.
+        """
+        return cls(name=name, visibility=visibility)
+
+
+class InitKnowledgebaseUploadRequest(BaseModel):
+    name: str = Field(..., description="The name of the knowledgebase")
+    file_names: List[str] = Field(..., min_length=1, description="Names of the files the client will upload directly to the file store")
     visibility: Visibility = Field(default=Visibility.PRIVATE, description="Visibility of the knowledge base, can be 'public' or 'private'")
 
 
-class AddResourcesRequest(BaseModel):
-    files: List[UploadFile] = Field(..., description="List of files to be added")
+class CommitKnowledgebaseUploadRequest(BaseModel):
+    kb_id: str = Field(..., description="The ID of the knowledgebase whose direct uploads have completed")
 
 
 class DeleteResourcesRequest(BaseModel):
@@ -1,4 +1,5 @@
-from typing import List, Dict, Union, Any, Tuple, Optional, Union
+from typing import AsyncIterator, Callable, List, Union, Tuple, Optional, TypeVar
+import asyncio
 import re
 
 # FastAPI
@@ -6,36 +7,62 @@ from fastapi import UploadFile, HTTPException, File, status
 
 # Beanie
 from beanie import PydanticObjectId
-import validators
 
 
 # Import models
-from app.models import ResourceDocument, KnowledgeBaseDocument, Visibility
+from app.models import ResourceDocument, KnowledgeBaseDocument, KnowledgeBaseSummary, Visibility
 
 # Import Exceptions
 from app import exceptions
 
 # Import Services
-from app.services.file_service import RemoteFileService
 from app.services.knowledge_service import KnowledgeBaseService, UploadSummary
 
+# Schemas
+from app.schemas import DirectUploadInit, FileUploadSuccess
+
+
+T = TypeVar('T')
+
 
 # Utility Functions
 # --------------------------------------------------------------------------------------------------------------------------------------------------- #
 
 
-def construct_directory_key(directories: list[str], max_depth: int = 2) -> str:
+# Compiled once at import: a slug is letters, digits, hyphens and underscores
+_SLUG_RE = re.compile(r'[-a-zA-Z0-9_]+')
+
+# Names are words of lowercase letters and digits separated by single spaces or hyphens, the slug alphabet names were always held to
+_NAME_RE = re.compile(r'[a-z0-9]+(?:[- ][a-z0-9]+)*')
+
+
+def construct_directory_key(directories: list[str]) -> str:
     """
     Constructs and validates a directory path from a list of directory names.
+    The path becomes an S3 prefix that is later deleted recursively, so it is always checked.
     """
-    if not directories or len(directories) > max_depth:
-        raise exceptions.InvalidPathError(f"Must provide between 1 and {max_depth} directory names.")
+    if not directories:
+        raise exceptions.InvalidPathError("Must provide at least one directory name.")
 
-    invalid_directories = [directory for directory in directories if not validators.slug(directory)]
+    invalid_directories = [directory for directory in directories if not _SLUG_RE.fullmatch(directory)]
     if invalid_directories:
         raise exceptions.InvalidPathError(f"Invalid directory names: {', '.join(invalid_directories)}")
 
-    return None
+    return '/'.join(directories)
+
+
+_END_OF_STREAM = object()
+
+
+async def _resume_stream(first: T, rest: AsyncIterator[T]) -> AsyncIterator[T]:
+    """
+    Yield a document that was already pulled from a stream, followed by the rest of it.
+    """
+    if first is _END_OF_STREAM:
+        return
+    yield first
+    async for document in rest:
+        yield document
 
 
 class AppService:
@@ -50,27 +77,38 @@ class AppService:
         """
         Helper to validate a name.
         """
-        name = name.strip()
-        if '  ' in name:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid name: contains multiple consecutive spaces.")
-        name = name.replace(' ', '-')
-        if not validators.slug(name):
+        if not _NAME_RE.fullmatch(name.strip()):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid name: contains special characters or improper use of hyphens.")
 
     def check_permission(self, entity: Union[ResourceDocument, KnowledgeBaseDocument], user_id: Optional[str]):
-        if entity.visibility != Visibility.PRIVATE:
+        if entity.is_public or str(entity.user_id) == user_id:
             return
-        if entity.user_id != user_id:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to modify this entity.")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to modify this entity.")
 
     async def get_knowledgebase(self, kb_id: str) -> KnowledgeBaseDocument:
         """
         Get KB by id with HTTP Exception Handling.
         """
         try:
-            return await self.kb_service.get_knowledgebase_by_id(kb_id)
+            # Callers check permissions on the result, so it is read fresh rather than from the shared cache
+            return await self.kb_service.get_knowledgebase_by_id(kb_id, fresh=True)
         except exceptions.KnowledgeBaseNotFound:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Knowledge base {kb_id} not found")
+        except exceptions.InvalidPathError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except exceptions.KBException as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error: {str(e)}")
+
+    async def get_knowledgebase_with_resource(self, kb_id: str, resource_id: str) -> KnowledgeBaseDocument:
+        """
+        Get KB by id, carrying only one resource's metadata, with HTTP Exception Handling.
+        """
+        try:
+            return await self.kb_service.get_knowledgebase_with_resource(kb_id, resource_id)
+        except exceptions.KnowledgeBaseNotFound:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Knowledge base {kb_id} not found")
+        except exceptions.InvalidPathError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         except exceptions.KBException as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error: {str(e)}")
 
@@ -79,19 +117,69 @@ class AppService:
         Get Resource by id with HTTP Exception Handling.
         """
         try:
-            return await self.kb_service.get_resource_by_id(resource_id)
+            # Callers check permissions on the result, so it is read fresh rather than from the shared cache
+            return await self.kb_service.get_resource_by_id(resource_id, fresh=True)
         except exceptions.ResourceNotFound:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Resource {resource_id} not found")
         except exceptions.ResourceException as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error: {str(e)}")
 
-    async def create_knowledgebase(self, name: str, visibility: Visibility = Visibility.PRIVATE, user_id: Optional[str] = None, files: Optional[List[UploadFile]] = File(...)) -> UploadSummary:
+    async def get_permitted_resources(self, resource_ids: List[str], user_id: Optional[str]) -> List[ResourceDocument]:
         """
-        Create a knowledgebase from file uploads.
+        Get several resources the user may modify in one query with HTTP Exception Handling.
+        """
+        try:
+            resources = await self.kb_service.get_permitted_resources_by_ids(resource_ids, user_id)
+        except exceptions.ResourceNotFound as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        except exceptions.ResourceException as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error: {str(e)}")
+
+        denied_ids = [resource_id for resource_id in resource_ids if str(resource_id) not in resources]
+        if denied_ids:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Resources {', '.join(denied_ids)} not found or you do not have permission to modify them")
+
+        return list(resources.values())
+
+    async def start_stream(self, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Open a stream and pull its first document with HTTP Exception Handling.
+        Once a streaming response has sent its headers errors can no longer change the status, so the query must have started by then.
+        """
+        try:
+            documents = aiter(open_stream())
+            first = await anext(documents, _END_OF_STREAM)
+        except exceptions.InvalidPathError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except exceptions.ResourceNotFound as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error: {str(e)}")
+
+        return _resume_stream(first, documents)
+
+    async def stream_knowledgebases(self, user_id: str) -> AsyncIterator[KnowledgeBaseSummary]:
+        """
+        Stream the knowledge bases of a user without materializing them in memory.
+        """
+        return await self.start_stream(lambda: self.kb_service.iter_all_knowledgebases_by_user_id(user_id))
+
+    async def stream_resources(self, user_id: str) -> AsyncIterator[ResourceDocument]:
+        """
+        Stream the resources of a user without materializing them in memory.
+        """
+        return await self.start_stream(lambda: self.kb_service.iter_all_resources_by_user_id(user_id))
+
+    async def _create_knowledgebase_record(self, name: str, visibility: Visibility, user_id: Optional[str]) -> Tuple[PydanticObjectId, str]:
+        """
+        Validate the name and create an empty knowledgebase, returning its id and remote directory.
         """
         self.validate_name(name)
         knowledgebase_id = PydanticObjectId()
-        remote_dir = construct_directory_key(directories=[str(user_id), str(knowledgebase_id)] if user_id else [str(knowledgebase_id)])
+        try:
+            remote_dir = construct_directory_key(directories=[str(user_id), str(knowledgebase_id)] if user_id else [str(knowledgebase_id)])
+        except exceptions.InvalidPathError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
         kb_create_dict = {
             'id': knowledgebase_id,
@@ -109,12 +197,63 @@ class AppService:
         except exceptions.KBException as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"An unknown error occurred: failed to create knowledgebase: {str(e)}")
 
+        return knowledgebase_id, remote_dir
+
+    async def create_knowledgebase(self, name: str, visibility: Visibility = Visibility.PRIVATE, user_id: Optional[str] = None, files: Optional[List[UploadFile]] = File(...)) -> UploadSummary:
+        """
+        Create a knowledgebase from file uploads.
+        """
+        knowledgebase_id, remote_dir = await self._create_knowledgebase_record(name, visibility, user_id)
+
         try:
             upload_summary = await self.kb_service.add_files_to_filestore(user_id, remote_dir, knowledgebase_id, name, files, visibility)
             return upload_summary
         except exceptions.KBException as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"File handling error: {str(e)}")
 
+    async def init_knowledgebase_upload(self, name: str, file_names: List[str], visibility: Visibility = Visibility.PRIVATE, user_id: Optional[str] = None) -> DirectUploadInit:
+        """
+        Create a knowledgebase and sign direct uploads of its files to the file store.
+        """
+        invalid_file_names = [file_name for file_name in file_names if not file_name or '/' in file_name]
+        if invalid_file_names:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid file names: {', '.join(invalid_file_names)}")
+
+        knowledgebase_id, remote_dir = await self._create_knowledgebase_record(name, visibility, user_id)
+
+        try:
+            uploads = self.kb_service.generate_upload_urls(remote_dir, list(dict.fromkeys(file_names)))
+        except exceptions.RemoteFileManagerException as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"File handling error: {str(e)}")
+
+        return DirectUploadInit.model_construct(kb_id=str(knowledgebase_id), uploads=uploads)
+
+    async def commit_knowledgebase_upload(self, kb_id: str, user_id: Optional[str]) -> UploadSummary:
+        """
+        Register the files uploaded directly to a knowledgebase's directory as resources.
+        """
+        kb = await self.get_knowledgebase(kb_id)
+        self.check_permission(kb, user_id)
+        if not kb.remote_dir:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Knowledge base {kb_id} has no directory in the file store")
+
+        try:
+            file_keys = await self.kb_service.list_files_in_file_store(kb.remote_dir)
+        except exceptions.RemoteFileManagerException as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"File handling error: {str(e)}")
+
+        # Committing again only registers the files that are not resources yet
+        registered_keys = {resource.remote_file_key for resource in kb.resources or []}
+        new_file_keys = [file_key for file_key in file_keys if file_key not in registered_keys]
+
+        try:
+            resources = await self.kb_service.register_uploaded_files(kb, new_file_keys, user_id)
+        except (exceptions.KBException, exceptions.ResourceException) as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unknown error occurred when registering uploaded files: {str(e)}")
+
+        successes = [FileUploadSuccess.model_construct(filename=resource.name, resource=resource) for resource in resources]
+        return UploadSummary.model_construct(successes=successes, errors=[])
+
     async def add_resources(self, kb_id: str, files: List[UploadFile], user_id: Optional[str]) -> UploadSummary:
         """
         Add one or more resources to a specific knowledge base.
@@ -163,22 +302,36 @@ class AppService:
         """
         Move a resource from one knowledge base to another.
         """
-        source_kb = await self.get_knowledgebase(source_kb_id)
-        target_kb = await self.get_knowledgebase(target_kb_id)
+        if source_kb_id == target_kb_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The source and target knowledge bases must differ.")
+
+        # The three lookups are independent, so run them concurrently.
+        # Of the source only the moved resource's metadata is needed, the rest of its resources are not loaded.
+        source_kb, target_kb, resource = await asyncio.gather(
+            self.get_knowledgebase_with_resource(source_kb_id, resource_id),
+            self.get_knowledgebase(target_kb_id),
+            self.get_resource(resource_id)
+        )
         self.check_permission(source_kb, user_id)
         self.check_permission(target_kb, user_id)
-
-        resource = await self.get_resource(resource_id)
         self.check_permission(resource, user_id)
 
+        if source_kb.get_resource(resource_id) is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Resource {resource_id} is not in knowledge base {source_kb_id}.")
+
         try:
-            await self.kb_service.move_file_in_file_store(resource, new_dir=target_kb.remote_dir)
+            resource = await self.kb_service.move_file_in_file_store(resource, new_dir=target_kb.remote_dir)
         except exceptions.RemoteFileManagerMoveError as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error moving file in file store: {str(e)}")
 
+        # Removal and addition touch different knowledge bases, so they can run concurrently
         try:
-            await self.remove_resources_from_kb(source_kb_id, [resource_id], user_id)
-            await self.kb_service.add_resources(kb_id=target_kb_id, resources=[resource])
+            await asyncio.gather(
+                self.kb_service.remove_resources_from_kb(source_kb_id, [resource_id]),
+                self.kb_service.add_resources(kb_id=target_kb_id, resources=[resource])
+            )
+        except exceptions.InvalidPathError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         except exceptions.KBException as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unknown error occurred when moving resource to another knowledge base: {str(e)}")
 
@@ -186,17 +339,15 @@ class AppService:
         """
         Delete resource by their ID.
         """
-        for resource_id in resource_ids:
-            resource = await self.get_resource(resource_id)
-            self.check_permission(resource, user_id)
+        resources = await self.get_permitted_resources(resource_ids, user_id)
 
         try:
-            await self.kb_service.delete_file_from_file_store(resource.remote_file_key)
+            await self.kb_service.delete_files_from_file_store([resource.remote_file_key for resource in resources if resource.remote_file_key])
         except exceptions.RemoteFileManagerDeleteError as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error deleting file from file store: {str(e)}")
 
         try:
-            await self.kb_service.delete_resources(resource_ids)
+            await self.kb_service.delete_resources(resource_ids, {resource.knowledgebase_id for resource in resources if resource.knowledgebase_id})
         except exceptions.CannotDeleteResource:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"One or more resources not found for deletion")
         except exceptions.ResourceException as e:
@@ -210,11 +361,8 @@ class AppService:
         self.check_permission(kb, user_id)
 
         try:
-            await self.kb_service.delete_directory_from_file_store(kb.remote_dir)
+            await self.kb_service.delete_knowledgebase(kb)
         except exceptions.RemoteFileManagerDeleteError as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error deleting knowledgebase: {str(e)}")
-
-        try:
-            await self.kb_service.delete_knowledgebase(kb_id)
         except exceptions.KBException as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unknown error occurred when attempting to delete knowledge base with ID {kb_id}: {str(e)}")
@@ -0,0 +1,111 @@
+# Typing
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Iterator, Optional, TypeVar
+
+# Asyncio
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Caching
+from cachetools import TTLCache
+
+
+V = TypeVar('V')
+
+
+# Identity map for the current request: repeated lookups within one request return the same object.
+# Outside of a request_scope it is None and only the TTL caches apply.
+_request_documents: ContextVar[Optional[Dict[Hashable, Any]]] = ContextVar('request_documents', default=None)
+
+
+@contextmanager
+def request_scope() -> Iterator[None]:
+    """
+    Give the enclosed code (one request) its own empty identity map.
+    """
+    token = _request_documents.set({})
+    try:
+        yield
+    finally:
+        _request_documents.reset(token)
+
+
+class _KeyLock:
+    """
+    Lock for one key, counting the callers holding or waiting on it so it is only dropped once none remain.
+    generation is bumped when the key is invalidated, so a load that started before it is not stored.
+    """
+    __slots__ = ('lock', 'users', 'generation')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.generation = 0
+
+
+class AsyncTTLCache(Generic[V]):
+    """
+    TTL + LRU cache for coroutine results with single-flight loading: concurrent misses on one key share a single load.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._locks: Dict[Hashable, _KeyLock] = {}
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[V]], fresh: bool = False) -> V:
+        """
+        Return the cached value for key, awaiting loader on a miss. Errors raised by loader are not cached.
+        fresh skips the shared cache and always loads, though the current request still reuses its own copy.
+        """
+        request_documents = _request_documents.get()
+        if request_documents is not None and (self, key) in request_documents:
+            return request_documents[(self, key)]
+
+        value = await self._get_or_load(key, loader, fresh)
+        if request_documents is not None:
+            request_documents[(self, key)] = value
+        return value
+
+    async def _get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[V]], fresh: bool) -> V:
+        if not fresh:
+            try:
+                return self._cache[key]
+            except KeyError:
+                pass
+
+        key_lock = self._locks.get(key)
+        if key_lock is None:
+            key_lock = self._locks[key] = _KeyLock()
+        key_lock.users += 1
+        try:
+            async with key_lock.lock:
+                # Another caller may have loaded the value while this one waited
+                if not fresh:
+                    try:
+                        return self._cache[key]
+                    except KeyError:
+                        pass
+
+                generation = key_lock.generation
+                value = await loader()
+                if generation == key_lock.generation:
+                    self._cache[key] = value
+                return value
+        finally:
+            key_lock.users -= 1
+            if not key_lock.users:
+                del self._locks[key]
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """
+        Drop the given keys from the cache.
+        """
+        request_documents = _request_documents.get()
+        for key in keys:
+            self._cache.pop(key, None)
+            # A key only has a lock while a load is in flight, and only that load can be stale
+            key_lock = self._locks.get(key)
+            if key_lock is not None:
+                key_lock.generation += 1
+            if request_documents is not None:
+                request_documents.pop((self, key), None)
@@ -1,24 +1,24 @@
 # Typing
 from typing import Any, Optional, List
-from fastapi import UploadFile, HTTPException
+from fastapi import UploadFile
 from abc import ABC, abstractmethod
 
-import re
+# Asyncio
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 # Boto3
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
 
 # Pydantic
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
-# TempFile and OS
-import tempfile
-import os
-
-# Import Exceptions
-from app import exceptions
+# Schemas
+from app.schemas import PresignedUpload
 
 
 # ABC Models
@@ -27,6 +27,8 @@ from app import exceptions
 
 
 class RemoteFileResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
     success: bool
     message: str
     file_key: Optional[str] = None
@@ -53,6 +55,18 @@ class RemoteFileService(ABC):
     async def delete_file(self, file_key: str) -> RemoteFileResponse:
         pass
 
+    @abstractmethod
+    def generate_upload_urls(self, dir_path: str, file_names: List[str]) -> List[PresignedUpload]:
+        pass
+
+    @abstractmethod
+    async def list_files(self, dir_key: str) -> List[str]:
+        pass
+
+    @abstractmethod
+    async def delete_files(self, file_keys: List[str]) -> RemoteFileResponse:
+        pass
+
     @abstractmethod
     async def delete_directory(self, dir_key: str) -> RemoteFileResponse:
         pass
@@ -87,25 +101,51 @@ def construct_file_key(dir_path: Optional[str], file_name: Optional[str], s3_fil
     return s3_file_key
 
 
+# Blocking S3 calls run on their own pool, sized to the client's connection pool, so a burst of
+# transfers cannot starve the default executor used by the rest of the app
+S3_EXECUTOR = ThreadPoolExecutor(max_workers=64, thread_name_prefix='s3')
+
+
+async def run_s3_call(fn, /, *args, **kwargs) -> Any:
+    """
+    Runs a blocking S3 call on the S3 executor and awaits its result.
+    """
+    return await asyncio.get_running_loop().run_in_executor(S3_EXECUTOR, partial(fn, *args, **kwargs))
+
+
+# Multipart settings for streamed uploads: parts are ~8MB and uploaded in parallel
+S3_TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024,
+                                    multipart_chunksize=8 * 1024 * 1024,
+                                    max_concurrency=8,
+                                    use_threads=True)
+
+
 async def upload_to_s3(s3_client: boto3.Session.resource, bucket_name: str, file: UploadFile, s3_file_key: str, tags: Optional[dict] = None):
     """
-    Uploads a file from FastAPI's UploadFile to an S3 bucket.
+    Streams a file from FastAPI's UploadFile to an S3 bucket.
     """
-    # Read the content of the UploadFile
-    byte_content = await file.read()
+    extra_args = {'Tagging': '&'.join(f"{key}={value}" for key, value in tags.items())} if tags else {}
+    if file.content_type:
+        extra_args['ContentType'] = file.content_type
+
+    # Anything that inspected the upload may have left the cursor mid-file
+    file.file.seek(0)
+
+    # Hand the underlying spooled file straight to boto3, which reads it in chunks.
+    # The transfer is blocking, so it runs on the S3 executor.
+    await run_s3_call(s3_client.Bucket(bucket_name).upload_fileobj,
+                      file.file,
+                      s3_file_key,
+                      ExtraArgs=extra_args,
+                      Config=S3_TRANSFER_CONFIG)
+
 
-    try:
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            tmp_file.write(byte_content)
-            tmp_file_path = tmp_file.name
+# DeleteObjects accepts at most this many keys per request
+S3_DELETE_BATCH_SIZE = 1000
 
-       # Upload the temporary file to the S3 bucket
-        extra_args = {'Tagging': '&'.join(f"{key}={value}" for key, value in tags.items())} if tags else {}
-        s3_client.Bucket(bucket_name).upload_file(tmp_file_path, s3_file_key, ExtraArgs=extra_args)
-    finally:
-        # Clean up the temporary file
-        if 'tmp_file_path' in locals():
-            os.remove(tmp_file_path)
+# Direct uploads: the size cap enforced by the presigned policy, and how long the policy stays valid
+PRESIGNED_UPLOAD_MAX_BYTES = 512 * 1024 * 1024
+PRESIGNED_UPLOAD_EXPIRES_IN = 900
 
 
 class S3Service(RemoteFileService):
@@ -117,6 +157,41 @@ class S3Service(RemoteFileService):
         self.s3_client = s3_client_connection
         self.bucket_name = bucket_name
 
+    def _copy_object(self, old_key: str, new_key: str) -> None:
+        """
+        Copies an object server-side within the bucket, keeping its metadata and tags.
+        This is blocking and is meant to run on the S3 executor.
+        """
+        self.s3_client.meta.client.copy_object(
+            Bucket=self.bucket_name,
+            Key=new_key,
+            CopySource={'Bucket': self.bucket_name, 'Key': old_key},
+            MetadataDirective='COPY'
+        )
+
+    def _list_keys(self, prefix: str) -> List[str]:
+        """
+        Lists every key under a prefix, following the listing's pagination.
+        This is blocking and is meant to run on the S3 executor.
+        """
+        paginator = self.s3_client.meta.client.get_paginator('list_objects_v2')
+        return [obj['Key'] for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix) for obj in page.get('Contents', [])]
+
+    def _delete_objects(self, file_keys: List[str]) -> List[dict]:
+        """
+        Deletes the given keys with batched DeleteObjects calls, returning the per-key errors reported by S3.
+        This is blocking and is meant to run on the S3 executor.
+        """
+        errors = []
+        for i in range(0, len(file_keys), S3_DELETE_BATCH_SIZE):
+            batch = file_keys[i:i + S3_DELETE_BATCH_SIZE]
+            response = self.s3_client.meta.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+            errors.extend(response.get('Errors', []))
+        return errors
+
     async def upload_file(self,
                           file: UploadFile,
                           dir_path: Optional[str] = None,
@@ -132,60 +207,108 @@ class S3Service(RemoteFileService):
 
         try:
             await upload_to_s3(self.s3_client, self.bucket_name, file, file_key, tags)
-            return S3Response(success=True, message="File uploaded successfully.", file_key=file_key, file_name=file_name)
+            return S3Response.model_construct(success=True, message="File uploaded successfully.", file_key=file_key, file_name=file_name)
         except ClientError as e:
-            return S3Response(success=False, message=f"Failed to upload file: {str(e)}")
+            return S3Response.model_construct(success=False, message=f"Failed to upload file: {str(e)}")
         except Exception as e:
-            return S3Response(success=False, message=f"Failed to upload file: {str(e)}")
+            return S3Response.model_construct(success=False, message=f"Failed to upload file: {str(e)}")
 
     async def delete_file(self, file_key: str) -> S3Response:
         """
         Deletes a single file from the S3 bucket.
         """
         try:
-            obj = self.s3_client.Object(self.bucket_name, file_key)
-            await obj.delete()
-            return S3Response(success=True, message="File deleted successfully.", file_key=file_key)
+            await run_s3_call(self.s3_client.meta.client.delete_object, Bucket=self.bucket_name, Key=file_key)
+            return S3Response.model_construct(success=True, message="File deleted successfully.", file_key=file_key)
+        except ClientError as e:
+            return S3Response.model_construct(success=False, message=f"Failed to delete file: {str(e)}", file_key=file_key)
+        except Exception as e:
+            return S3Response.model_construct(success=False, message=f"Failed to delete file: {str(e)}", file_key=file_key)
+
+    def generate_upload_urls(self, dir_path: str, file_names: List[str]) -> List[PresignedUpload]:
+        """
+        Signs a presigned POST per file so clients upload straight to the S3 bucket. Signing is local and makes no request.
+        """
+        client = self.s3_client.meta.client
+        uploads = []
+        for file_name in file_names:
+            file_key = construct_file_key(dir_path, file_name, None)
+            presigned_post = client.generate_presigned_post(
+                Bucket=self.bucket_name,
+                Key=file_key,
+                Conditions=[["content-length-range", 0, PRESIGNED_UPLOAD_MAX_BYTES]],
+                ExpiresIn=PRESIGNED_UPLOAD_EXPIRES_IN
+            )
+            uploads.append(PresignedUpload(file_name=file_name, file_key=file_key, url=presigned_post['url'], fields=presigned_post['fields']))
+        return uploads
+
+    async def list_files(self, dir_key: str) -> List[str]:
+        """
+        Lists the keys of every file within a directory of the S3 bucket.
+        """
+        prefix = dir_key if dir_key.endswith('/') else f"{dir_key}/"
+        return await run_s3_call(self._list_keys, prefix)
+
+    def _delete_prefix(self, prefix: str) -> Optional[List[dict]]:
+        """
+        Deletes every key under a prefix one listing page at a time, returning the per-key errors or None when nothing was found.
+        This is blocking and is meant to run on the S3 executor.
+        """
+        paginator = self.s3_client.meta.client.get_paginator('list_objects_v2')
+        found = False
+        errors = []
+        # Pages hold at most 1000 keys, so each one is a single DeleteObjects call
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            keys = [obj['Key'] for obj in page.get('Contents', [])]
+            if keys:
+                found = True
+                errors.extend(self._delete_objects(keys))
+        return errors if found else None
+
+    async def delete_files(self, file_keys: List[str]) -> S3Response:
+        """
+        Deletes several files from the S3 bucket with batched DeleteObjects calls.
+        """
+        try:
+            errors = await run_s3_call(self._delete_objects, file_keys)
+            success = not errors
+            message = "All files deleted successfully." if success else f"Some files could not be deleted: {', '.join(error['Key'] for error in errors)}"
+            return S3Response.model_construct(success=success, message=message)
         except ClientError as e:
-            return S3Response(success=False, message=f"Failed to delete file: {str(e)}", file_key=file_key)
+            return S3Response.model_construct(success=False, message=f"Failed to delete files: {str(e)}")
         except Exception as e:
-            return S3Response(success=False, message=f"Failed to delete file: {str(e)}", file_key=file_key)
+            return S3Response.model_construct(success=False, message=f"Failed to delete files: {str(e)}")
 
     async def delete_directory(self, dir_key: str) -> S3Response:
         """
         Deletes a directory (all files within a directory) from the S3 bucket.
         """
         try:
-            # List all objects within the directory
-            objects_to_delete = self.s3_client.meta.client.list_objects_v2(Bucket=self.bucket_name, Prefix=dir_key)
-            if 'Contents' in objects_to_delete:
-                delete_responses = []
-                for obj in objects_to_delete['Contents']:
-                    obj_key = obj['Key']
-                    response = await self.delete_file(obj_key)
-                    delete_responses.append(response)
-                success = all(resp.success for resp in delete_responses)
-                message = "All objects deleted successfully." if success else "Some objects could not be deleted."
-                return S3Response(success=success, message=message, file_key=dir_key)
-            else:
-                return S3Response(success=False, message="Directory not found.", file_key=dir_key)
+            # List and delete every page of objects within the directory off the event loop
+            prefix = dir_key if dir_key.endswith('/') else f"{dir_key}/"
+            errors = await run_s3_call(self._delete_prefix, prefix)
+            # Nothing to delete is not a failure: a knowledgebase may never have had files
+            if errors is None:
+                return S3Response.model_construct(success=True, message="Directory is already empty.", file_key=dir_key)
+            success = not errors
+            message = "All objects deleted successfully." if success else f"Some objects could not be deleted: {', '.join(error['Key'] for error in errors)}"
+            return S3Response.model_construct(success=success, message=message, file_key=dir_key)
         except ClientError as e:
-            return S3Response(success=False, message=f"Failed to delete directory: {str(e)}", file_key=dir_key)
+            return S3Response.model_construct(success=False, message=f"Failed to delete directory: {str(e)}", file_key=dir_key)
         except Exception as e:
-            return S3Response(success=False, message=f"Failed to delete directory: {str(e)}", file_key=dir_key)
+            return S3Response.model_construct(success=False, message=f"Failed to delete directory: {str(e)}", file_key=dir_key)
 
     async def move_file(self, old_key: str, new_dir: str, file_name: str) -> S3Response:
         """
         Moves a file from one key to another within the S3 bucket.
         """
-        new_key = construct_file_key(new_dir, file_name)
+        new_key = construct_file_key(new_dir, file_name, None)
 
         try:
-            copy_source = {'Bucket': self.bucket_name, 'Key': old_key}
-            self.s3_client.Object(self.bucket_name, new_key).copy_from(CopySource=copy_source)
-            await self.delete_file(old_key)
-            return S3Response(success=True, message="File moved successfully.", file_key=new_key)
+            await run_s3_call(self._copy_object, old_key, new_key)
+            await run_s3_call(self.s3_client.meta.client.delete_object, Bucket=self.bucket_name, Key=old_key)
+            return S3Response.model_construct(success=True, message="File moved successfully.", file_key=new_key)
         except ClientError as e:
-            return S3Response(success=False, message=f"Failed to move file: {str(e)}", file_key=new_key)
+            return S3Response.model_construct(success=False, message=f"Failed to move file: {str(e)}", file_key=new_key)
         except Exception as e:
-            return S3Response(success=False, message=f"Failed to move file: {str(e)}", file_key=new_key)
+            return S3Response.model_construct(success=False, message=f"Failed to move file: {str(e)}", file_key=new_key)
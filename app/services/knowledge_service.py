@@ -1,23 +1,88 @@
-from typing import List, Dict, Union, Any, Optional, Tuple
-import re
+from typing import AsyncIterator, Awaitable, Callable, Coroutine, Iterable, List, Dict, Set, Type, TypeVar, Union, Any, Optional, Tuple
+import asyncio
+import functools
+import inspect
+import logging
 
 # FastAPI
 from fastapi import UploadFile
 
+# Beanie
+from beanie import PydanticObjectId
+
 # Import The Adapters and Other Services
 from app.adapters import KnowledgeBaseAdapter, ResourceAdapter
-from app.services import RemoteFileService
+from app.services.file_service import RemoteFileService, RemoteFileResponse
+from app.services.cache import AsyncTTLCache
 
 # Import the resource document
-from app.models import ResourceDocument, KnowledgeBaseDocument, Visibility
+from app.models import ResourceDocument, KnowledgeBaseDocument, RESOURCE_METADATA_FIELDS, KnowledgeBaseSummary, Visibility
 
 # Schemas
-from app.schemas import FileUploadError, FileUploadSuccess, UploadSummary
+from app.schemas import FileUploadError, FileUploadSuccess, PresignedUpload, UploadSummary
 
 # Exceptions
 from app import exceptions
 
 
+# Upper bound on concurrent file uploads per batch, keeps the S3 connection pool from being exhausted
+MAX_CONCURRENT_UPLOADS = 8
+
+# Process-wide caches of single-document lookups, shared by every request.
+# Writes through this service invalidate the affected entries; other writers are seen once the TTL lapses.
+DOCUMENT_CACHE_TTL_SECONDS = 30
+knowledgebase_cache: AsyncTTLCache[KnowledgeBaseDocument] = AsyncTTLCache(maxsize=1024, ttl=DOCUMENT_CACHE_TTL_SECONDS)
+resource_cache: AsyncTTLCache[ResourceDocument] = AsyncTTLCache(maxsize=1024, ttl=DOCUMENT_CACHE_TTL_SECONDS)
+
+# Cleanup that callers should not wait on. The event loop only keeps weak references to tasks,
+# so they are held here until done, and drained on shutdown.
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def run_in_background(coro: Coroutine[Any, Any, Any]) -> None:
+    """
+    Schedule a coroutine without awaiting it, keeping a reference until it finishes.
+    """
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def drain_background_tasks() -> None:
+    """
+    Wait for every scheduled background task to finish.
+    """
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+
+T = TypeVar('T')
+
+
+def translate_exceptions(*,
+                         wrap: Type[Exception],
+                         msg: str,
+                         passthrough: Tuple[Type[BaseException], ...] = ()) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """
+    Re-raise anything a service method raises as wrap, except the passthrough exceptions.
+    msg is formatted with the method's arguments, and the original error is appended to it.
+    """
+    def decorator(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs) -> T:
+            try:
+                return await fn(*args, **kwargs)
+            except passthrough:
+                raise
+            except Exception as e:
+                # Only bound on the error path, the success path pays for the one handler
+                arguments = signature.bind(*args, **kwargs).arguments
+                raise wrap(f"{msg.format(**arguments)}: {str(e)}") from e
+        return wrapper
+    return decorator
+
+
 class KnowledgeBaseService:
     """
     Business logic layer that handles operations on knowledge bases and their resources.
@@ -34,103 +99,112 @@ class KnowledgeBaseService:
     # Helper Methods
     # ------------------------------------------------------------------------------------------------------------------------- #
 
+    @translate_exceptions(wrap=exceptions.KBException, msg="An unknown error occurred when updating resource metadata in knowledge base for ID {kb_id}")
     async def _update_resource_metadata_in_kb(self, kb_id: str, resource_id: str, updates: Dict[str, Any]) -> None:
         """
-        Update the metadata of a resource within a knowledge base.
+        Update the metadata of a resource within a knowledge base in place, without reading or rewriting its resources.
+        """
+        await self.kb_adapter.patch_embedded_resource(kb_id, resource_id, updates)
+
+    async def _delete_orphaned_files(self, file_keys: List[str]) -> None:
+        """
+        Best-effort removal of uploaded files that no resource refers to. Failures are logged, not raised.
         """
         try:
-            kb_doc = await self.get_knowledgebase_by_id(kb_id)
-            updated = False
-            for resource in kb_doc.resources:
-                if resource.resource_id == resource_id:
-                    for key, value in updates.items():
-                        if hasattr(resource, key):
-                            setattr(resource, key, value)
-                    updated = True
-                    break
-            if updated:
-                await self.kb_adapter.update_kb(kb_id, {'resources': kb_doc.resources})
+            response = await self.remote_file_service.delete_files(file_keys)
+            if not response.success:
+                logging.warning(f"Failed to clean up orphaned files {file_keys}: {response.message}")
         except Exception as e:
-            raise exceptions.KBException(f"An unknown error occurred when updating resource metadata in knowledge base for ID {kb_id}: {str(e)}")
+            logging.warning(f"Failed to clean up orphaned files {file_keys}: {str(e)}")
 
     # Get Methods
     # ------------------------------------------------------------------------------------------------------------------------- #
     # ------------------------------------------------------------------------------------------------------------------------- #
 
-    async def get_knowledgebase_by_id(self, kb_id: str) -> KnowledgeBaseDocument:
+    @translate_exceptions(wrap=exceptions.KBException, msg="An unknown error occurred when retrieving knowledge base {kb_id}", passthrough=(exceptions.KnowledgeBaseNotFound, exceptions.InvalidPathError))
+    async def get_knowledgebase_by_id(self, kb_id: str, fresh: bool = False) -> KnowledgeBaseDocument:
         """
-        Retrieve a single knowledge base by its ID.
+        Retrieve a single knowledge base by its ID. fresh bypasses the shared cache.
         """
-        try:
-            return await self.kb_adapter.get_kb_by_id(kb_id)
-        except exceptions.KnowledgeBaseNotFound as e:
-            raise e
-        except Exception as e:
-            raise exceptions.KBException(f"An unknown error occurred when retrieving knowledge base {kb_id}: {str(e)}")
+        return await knowledgebase_cache.get_or_load(str(kb_id), lambda: self.kb_adapter.get_kb_by_id(kb_id), fresh=fresh)
 
-    async def get_resource_by_id(self, resource_id: str) -> ResourceDocument:
+    @translate_exceptions(wrap=exceptions.ResourceException, msg="An unknown error occurred when attempting to retrieve resource with ID {resource_id}", passthrough=(exceptions.ResourceNotFound,))
+    async def get_resource_by_id(self, resource_id: str, fresh: bool = False) -> ResourceDocument:
         """
-        Retrieve a single resource by its ID.
+        Retrieve a single resource by its ID. fresh bypasses the shared cache.
         """
-        try:
-            return await self.resource_adapter.get(resource_id)
-        except exceptions.ResourceNotFound as e:
-            raise e
-        except Exception as e:
-            raise exceptions.ResourceException(f"An unknown error occurred when attempting to retrieve resource with ID {resource_id}: {str(e)}")
+        return await resource_cache.get_or_load(str(resource_id), lambda: self.resource_adapter.get_resource_by_id(resource_id), fresh=fresh)
 
+    @translate_exceptions(wrap=exceptions.KBException, msg="An unknown error occurred when retrieving knowledge base {kb_id}", passthrough=(exceptions.KnowledgeBaseNotFound, exceptions.InvalidPathError))
+    async def get_knowledgebase_with_resource(self, kb_id: str, resource_id: str) -> KnowledgeBaseDocument:
+        """
+        Retrieve a knowledge base carrying only the embedded metadata of one resource. Not cached, as the document is partial.
+        """
+        return await self.kb_adapter.get_kb_with_resource(kb_id, resource_id)
+
+    @translate_exceptions(wrap=exceptions.ResourceException, msg="An unknown error occurred when attempting to retrieve resources with IDs {resource_ids}", passthrough=(exceptions.ResourceNotFound,))
+    async def get_permitted_resources_by_ids(self, resource_ids: List[str], user_id: Optional[str]) -> Dict[str, ResourceDocument]:
+        """
+        Retrieve the resources a user may modify in a single query, keyed by ID.
+        """
+        return await self.resource_adapter.get_permitted_resources_by_ids(resource_ids, user_id)
+
+    @translate_exceptions(wrap=exceptions.ResourceException, msg="An unknown error occurred when attempting to retrieve resources for user ID {user_id}", passthrough=(exceptions.ResourceNotFound,))
     async def get_all_resources_by_user_id(self, user_id: str) -> List[ResourceDocument]:
         """
         Retrieve all resources associated with a specific user ID.
         """
-        try:
-            return await self.resource_adapter.get_all_by_user_id(user_id)
-        except exceptions.ResourceNotFound as e:
-            raise e
-        except Exception as e:
-            raise exceptions.ResourceException(f"An unknown error occurred when attempting to retrieve resources for user ID {user_id}: {str(e)}")
+        return await self.resource_adapter.get_all_by_user_id(user_id)
 
-    async def get_all_knowledgebases_by_user_id(self, user_id: str) -> List[KnowledgeBaseDocument]:
+    @translate_exceptions(wrap=exceptions.KBException, msg="An unknown error occurred when retrieving knowledge bases for user {user_id}", passthrough=(exceptions.KnowledgeBasesForUserNotFound,))
+    async def get_all_knowledgebases_by_user_id(self, user_id: str) -> List[KnowledgeBaseSummary]:
         """
         Retrieve all knowledge bases associated with a specific user ID.
         """
-        try:
-            return await self.kb_adapter.get_all_by_user_id(user_id)
-        except exceptions.KnowledgeBasesForUserNotFound as e:
-            raise e
-        except Exception as e:
-            raise exceptions.KBException(f"An unknown error occurred when retrieving knowledge bases for user {user_id}: {str(e)}")
+        return await self.kb_adapter.get_all_by_user_id(user_id)
+
+    def iter_all_resources_by_user_id(self, user_id: str) -> AsyncIterator[ResourceDocument]:
+        """
+        Stream all resources associated with a specific user ID.
+        """
+        return self.resource_adapter.iter_all_by_user_id(user_id)
+
+    def iter_all_knowledgebases_by_user_id(self, user_id: str) -> AsyncIterator[KnowledgeBaseSummary]:
+        """
+        Stream all knowledge bases associated with a specific user ID.
+        """
+        return self.kb_adapter.iter_all_by_user_id(user_id)
 
     # Create Methods
     # ------------------------------------------------------------------------------------------------------------------------- #
     # ------------------------------------------------------------------------------------------------------------------------- #
 
+    @translate_exceptions(wrap=exceptions.KBException, msg="An unknown error occurred during knowledge base creation", passthrough=(exceptions.CannotCreateKnowledgeBase,))
     async def create_knowledgebase(self, create_dict: Dict[str, Any]) -> KnowledgeBaseDocument:
         """
         Create a new knowledge base document from the provided dictionary.
         """
-        try:
-            return await self.kb_adapter.create(create_dict)
-        except exceptions.CannotCreateKnowledgeBase as e:
-            raise e
-        except Exception as e:
-            raise exceptions.KBException(f"An unknown error occurred during knowledge base creation: {str(e)}")
+        return await self.kb_adapter.create(create_dict)
 
+    @translate_exceptions(wrap=exceptions.ResourceException, msg="An unknown error occurred when attempting to create a resource", passthrough=(exceptions.CannotCreateResource,))
     async def create_resource(self, create_dict: Dict[str, Any]) -> ResourceDocument:
         """
         Create a new resource document from the provided dictionary.
         """
-        try:
-            return await self.resource_adapter.create_resource(create_dict)
-        except exceptions.CannotCreateResource as e:
-            raise e
-        except Exception as e:
-            raise exceptions.ResourceException(f"An unknown error occurred when attempting to create a resource: {str(e)}")
+        return await self.resource_adapter.create_resource(create_dict)
+
+    @translate_exceptions(wrap=exceptions.ResourceException, msg="An unknown error occurred when attempting to create resources", passthrough=(exceptions.CannotCreateResource,))
+    async def create_resources(self, create_dicts: List[Dict[str, Any]], skip_duplicates: bool = False) -> List[ResourceDocument]:
+        """
+        Create several resource documents in one batch, optionally skipping the ones that already exist.
+        """
+        return await self.resource_adapter.bulk_create(create_dicts, skip_duplicates=skip_duplicates)
 
     # Update Methods
     # ------------------------------------------------------------------------------------------------------------------------- #
     # ------------------------------------------------------------------------------------------------------------------------- #
 
+    @translate_exceptions(wrap=exceptions.KBException, msg="An unknown error occurred when trying to add resources to knowledge base with ID {kb_id}", passthrough=(exceptions.ResourceAdditionError,))
     async def add_resources(self, kb_id: str, resources: Union[ResourceDocument, List[ResourceDocument]]) -> None:
         """
         Add one or more resources to a specific knowledge base.
@@ -138,132 +212,111 @@ class KnowledgeBaseService:
         """
         try:
             await self.kb_adapter.add_resources(kb_id, resources)
-        except exceptions.ResourceAdditionError as e:
-            raise e
-        except Exception as e:
-            raise exceptions.KBException(f"An unknown error occurred when trying to add resources to knowledge base with ID {kb_id}: {str(e)}")
+        finally:
+            knowledgebase_cache.invalidate(str(kb_id))
 
+    @translate_exceptions(wrap=exceptions.KBException, msg="An unknown error occurred when updating knowledge base for ID {kb_id}", passthrough=(exceptions.InvalidNameError,))
     async def update_knowledgebase(self, kb_id: str, updates: Dict[str, Any]) -> None:
         """
         Update specific fields of a knowledge base.
         """
         try:
             await self.kb_adapter.update_kb(kb_id, updates)
-        except exceptions.InvalidNameError as e:
-            raise e
-        except Exception as e:
-            raise exceptions.KBException(f"An unknown error occurred when updating knowledge base for ID {kb_id}: {str(e)}")
+        finally:
+            knowledgebase_cache.invalidate(str(kb_id))
 
-    async def update_resource(self, resource_id: str, updates: Dict[str, Any]) -> None:
+    @translate_exceptions(wrap=exceptions.ResourceException, msg="An unknown error occurred when attempting to update resource for ID {resource_id}", passthrough=(exceptions.InvalidNameError,))
+    async def update_resource(self, resource_id: str, updates: Dict[str, Any]) -> ResourceDocument:
         """
-        Update specific fields of a resource.
+        Update specific fields of a resource, and its metadata in its knowledge base.
         """
+        patched_kb_id = None
         try:
-            await self.resource_adapter.update_resource(resource_id, updates)
-
-            resource_doc = await self.get_resource_by_id(resource_id)
-            knowledgebase_id = resource_doc.knowledgebase_id
-
-            if knowledgebase_id:
-                await self._update_resource_metadata_in_kb(knowledgebase_id, resource_id, updates)
-        except exceptions.InvalidNameError as e:
-            raise e
-        except Exception as e:
-            raise exceptions.ResourceException(f"An unknown error occurred when attempting to update resource for ID {resource_id}: {str(e)}")
+            # The update returns the new document, so its knowledge base is known without another read
+            resource = await self.resource_adapter.update_resource(resource_id, updates)
+
+            # Only mirrored fields touch the knowledge base, taken from the stored document so they match it exactly
+            kb_updates = {key: getattr(resource, key) for key in updates if key in RESOURCE_METADATA_FIELDS}
+            if resource.knowledgebase_id and kb_updates:
+                patched_kb_id = resource.knowledgebase_id
+                await self._update_resource_metadata_in_kb(patched_kb_id, resource_id, kb_updates)
+            return resource
+        finally:
+            resource_cache.invalidate(str(resource_id))
+            if patched_kb_id:
+                knowledgebase_cache.invalidate(str(patched_kb_id))
 
     # Remove Methods
     # ------------------------------------------------------------------------------------------------------------------------- #
     # ------------------------------------------------------------------------------------------------------------------------- #
 
+    @translate_exceptions(wrap=exceptions.KBException, msg="An unknown error occurred when attempting to remove resources from knowledge base with ID {kb_id}", passthrough=(exceptions.KnowledgeBaseNotFound, exceptions.InvalidPathError, exceptions.ResourceDeleteError))
     async def remove_resources_from_kb(self, kb_id: str, resource_ids: Union[str, List[str]]) -> None:
         """
         Remove one or more resource's metadata by their IDs from a specific knowledge base.
         """
-        if not isinstance(resource_ids, list):
-            resource_ids = [resource_ids]
-
         try:
             await self.kb_adapter.remove_resources(kb_id, resource_ids)
-        except exceptions.KnowledgeBaseNotFound as e:
-            raise e
-        except exceptions.ResourceDeleteError as e:
-            raise e
-        except Exception as e:
-            raise exceptions.KBException(f"An unknown error occurred when attempting to remove resources from knowledge base with ID {kb_id}: {str(e)}")
+        finally:
+            knowledgebase_cache.invalidate(str(kb_id))
 
     # Delete Methods
     # ------------------------------------------------------------------------------------------------------------------------- #
     # ------------------------------------------------------------------------------------------------------------------------- #
 
-    async def delete_resources(self, resource_ids: List[str]) -> None:
+    @translate_exceptions(wrap=exceptions.ResourceException, msg="An unknown error occurred when attempting to delete resources with IDs {resource_ids}", passthrough=(exceptions.CannotDeleteResource,))
+    async def delete_resources(self, resource_ids: List[str], knowledgebase_ids: Iterable[str] = ()) -> None:
         """
-        Delete resources by their IDs.
-        """
-        for resource_id in resource_ids:
-            try:
-                await self.resource_adapter.delete_resource(resource_id)
-            except exceptions.CannotDeleteResource as e:
-                raise e  # Re-raising as it's crucial for transactional integrity.
-            except Exception as e:
-                raise exceptions.ResourceException(f"An unknown error occurred when attempting to delete resource with ID {resource_id}: {str(e)}")
-
-    async def delete_knowledgebase(self, kb_id: str) -> None:
-        """
-        Delete a knowledge base by its ID and all its associated resources.
+        Delete resources by their IDs, and remove their metadata from the knowledge bases that embed them.
+        The resources are deleted first, and only the IDs confirmed deleted are pulled from the knowledge bases.
+        knowledgebase_ids names the knowledge bases whose cached documents go stale.
         """
+        unique_ids = list(dict.fromkeys(str(resource_id) for resource_id in resource_ids))
         try:
-            await self.kb_adapter.delete(kb_id)
-        except Exception as e:
-            raise exceptions.KBException(f"An unknown error occurred when attempting to delete knowledge base with ID {kb_id}: {str(e)}")
+            deleted_count = await self.resource_adapter.delete_many(unique_ids)
 
-    # File Handling Methods
-    # ------------------------------------------------------------------------------------------------------------------------- #
-    # ------------------------------------------------------------------------------------------------------------------------- #
+            # On a partial delete, the resources that survived keep their metadata
+            deleted_ids = unique_ids
+            if deleted_count < len(unique_ids):
+                remaining_ids = await self.resource_adapter.get_existing_ids(unique_ids)
+                deleted_ids = [resource_id for resource_id in unique_ids if resource_id not in remaining_ids]
 
-    async def add_file_to_filestore(self,
-                                    file: UploadFile,
-                                    remote_dir: str,
-                                    knowledgebase_id: str,
-                                    knowledgebase_name: str,
-                                    visibility: Visibility,
-                                    user_id: Optional[str] = None
-                                    ) -> Tuple[bool, Union[ResourceDocument, str]]:
-        """
-        Manages the upload and resource creation for a single file.
-        """
-        resource_dict = {
-            'name': file.filename,
-            'knowledgebase_id': knowledgebase_id,
-            'knowledgebase_name': knowledgebase_name,
-        }
+            await self.kb_adapter.remove_resources_from_all(deleted_ids)
+        finally:
+            resource_cache.invalidate(*unique_ids)
+            knowledgebase_cache.invalidate(*(str(kb_id) for kb_id in knowledgebase_ids))
 
-        if user_id:
-            resource_dict['user_id'] = user_id
+        if deleted_count < len(unique_ids):
+            raise exceptions.CannotDeleteResource(f"{len(unique_ids) - deleted_count} of {len(unique_ids)} resources not found for deletion.")
+
+    @translate_exceptions(wrap=exceptions.KBException, msg="An unknown error occurred when attempting to delete knowledge base with ID {kb.id}", passthrough=(exceptions.KBException, exceptions.RemoteFileManagerDeleteError))
+    async def delete_knowledgebase(self, kb: KnowledgeBaseDocument) -> None:
+        """
+        Delete a loaded knowledge base along with its resource documents and its directory in the file store.
+        """
+        kb_id = str(kb.id)
 
+        # The knowledge base goes first: if it survives, its resources and files must too
         try:
-            resource = await self.create_resource(resource_dict)
-            resource_id = resource.id
-        except Exception as ex:
-            return False, str(ex)
+            await self.kb_adapter.delete(kb_id)
+        finally:
+            knowledgebase_cache.invalidate(kb_id)
 
-        tags = {
-            'visibility': visibility,
-            'resource_id': resource_id,
-            'knowledgebase_id': knowledgebase_id
-        }
-        if user_id:
-            tags['user_id'] = user_id
+        # Nothing refers to them any more, so the resources and files are deleted concurrently
+        deletes = [self.resource_adapter.delete_by_knowledgebase_id(kb_id)]
+        if kb.remote_dir:
+            deletes.append(self.delete_directory_from_file_store(kb.remote_dir))
+        results = await asyncio.gather(*deletes, return_exceptions=True)
 
-        upload_response = await self.remote_file_service.upload_file(file=file, dir_path=remote_dir, file_name=file.filename, tags=tags)
-        if not upload_response.success:
-            return False, upload_response.message
+        resource_cache.invalidate(*(str(resource.resource_id) for resource in kb.resources or []))
 
-        try:
-            await self.update_resource(resource_id, {'remote_file_key': upload_response.file_key})
-            return True, resource
-        except Exception as ex:
-            await self.remote_file_service.delete_file(upload_response.file_key)
-            return False, str(ex)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    # File Handling Methods
+    # ------------------------------------------------------------------------------------------------------------------------- #
+    # ------------------------------------------------------------------------------------------------------------------------- #
 
     async def add_files_to_filestore(self,
                                      user_id: Optional[str],
@@ -274,67 +327,173 @@ class KnowledgeBaseService:
                                      visibility: Visibility) -> UploadSummary:
         """
         Handles file uploads and resource creation for a knowledgebase.
+        The resources are created, updated and cleaned up in batches, so the database cost does not grow with the number of files.
         """
+        if not files:
+            return UploadSummary.model_construct(successes=[], errors=[])
+
         successes: List[FileUploadSuccess] = []
         errors: List[FileUploadError] = []
 
+        resource_dicts = []
         for file in files:
-            success, result = await self.handle_single_file(file, remote_dir, knowledgebase_id, knowledgebase_name, visibility, user_id)
-            if success:
-                successes.append(FileUploadSuccess(filename=file.filename, resource=result))
+            resource_dict = {
+                'name': file.filename,
+                'knowledgebase_id': knowledgebase_id,
+                'knowledgebase_name': knowledgebase_name,
+            }
+            if user_id:
+                resource_dict['user_id'] = user_id
+            resource_dicts.append(resource_dict)
+
+        try:
+            resources = await self.create_resources(resource_dicts)
+        except exceptions.ResourceException as e:
+            await asyncio.gather(*(file.close() for file in files), return_exceptions=True)
+            errors = [FileUploadError.model_construct(filename=file.filename, error_message=str(e)) for file in files]
+            return UploadSummary.model_construct(successes=successes, errors=errors)
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+        # Tags shared by every file in the batch, each file only adds its resource ID
+        base_tags = {
+            'visibility': visibility,
+            'knowledgebase_id': knowledgebase_id
+        }
+        if user_id:
+            base_tags['user_id'] = user_id
+
+        async def upload_single_file(file: UploadFile, resource: ResourceDocument) -> RemoteFileResponse:
+            tags = {**base_tags, 'resource_id': resource.resource_id}
+            async with semaphore:
+                return await self.remote_file_service.upload_file(file=file, dir_path=remote_dir, file_name=file.filename, tags=tags)
+
+        # Files are independent of each other, upload them concurrently. One file raising must not cancel the others.
+        responses = await asyncio.gather(*(upload_single_file(file, resource) for file, resource in zip(files, resources)), return_exceptions=True)
+        await asyncio.gather(*(file.close() for file in files), return_exceptions=True)
+
+        uploaded: List[Tuple[UploadFile, ResourceDocument]] = []
+        failed_resource_ids: List[PydanticObjectId] = []
+        for file, resource, response in zip(files, resources, responses):
+            if isinstance(response, BaseException) or not response.success:
+                error_message = str(response) if isinstance(response, BaseException) else response.message
+                errors.append(FileUploadError.model_construct(filename=file.filename, error_message=error_message))
+                failed_resource_ids.append(resource.resource_id)
             else:
-                errors.append(FileUploadError(filename=file.filename, error_message=str(result)))
+                resource.remote_file_key = response.file_key
+                uploaded.append((file, resource))
+
+        try:
+            await self.resource_adapter.bulk_update({resource.resource_id: {'remote_file_key': resource.remote_file_key} for _, resource in uploaded})
+        except Exception as e:
+            # No resource points at these files, so remove them along with their resources. The caller does not wait on the cleanup.
+            run_in_background(self._delete_orphaned_files([resource.remote_file_key for _, resource in uploaded]))
+            errors.extend(FileUploadError.model_construct(filename=file.filename, error_message=str(e)) for file, _ in uploaded)
+            failed_resource_ids.extend(resource.resource_id for _, resource in uploaded)
+            uploaded = []
 
-            await file.close()
+        if failed_resource_ids:
+            try:
+                await self.resource_adapter.delete_many(failed_resource_ids)
+            except exceptions.ResourceException as e:
+                logging.warning(f"Failed to clean up resources for failed uploads {failed_resource_ids}: {str(e)}")
+
+        # Built from trusted service state, so skip re-validating the embedded documents
+        successes = [FileUploadSuccess.model_construct(filename=file.filename, resource=resource) for file, resource in uploaded]
 
+        # The file keys are set before the metadata is embedded, so the knowledge base takes one write for the whole batch
         if successes:
             try:
                 await self.add_resources(knowledgebase_id, [success.resource for success in successes])
             except (exceptions.ResourceAdditionError, exceptions.KBException) as e:
                 raise exceptions.RemoteFileManagerAddError(f"Files parsed successfully buy failed to add resources to knowledge base: {str(e)}")
 
-        return UploadSummary(successes=successes, errors=errors)
+        return UploadSummary.model_construct(successes=successes, errors=errors)
 
-
-    async def move_file_in_file_store(self, resource: ResourceDocument, new_dir: str) -> None:
+    def generate_upload_urls(self, remote_dir: str, file_names: List[str]) -> List[PresignedUpload]:
         """
-        Handles file movements between directories.
+        Handles signing direct uploads of files to the file store.
         """
         try:
-            old_key = resource.remote_file_key
-            response = await self.remote_file_service.move_file(old_key, new_dir, resource.name)
-            if response.success:
-                resource.remote_file_key = response.file_key
-                await resource.save()
-            else:
-                raise exceptions.RemoteFileManagerMoveError(f"An error occurred while moving the file: {response.message}")
-        except exceptions.RemoteFileManagerMoveError:
-            raise
+            return self.remote_file_service.generate_upload_urls(remote_dir, file_names)
         except Exception as e:
-            raise exceptions.RemoteFileManagerMoveError(f"An unknown error occurred while moving the file: {str(e)}")
+            raise exceptions.RemoteFileManagerAddError(f"An error occurred while signing the file uploads: {str(e)}")
+
+    @translate_exceptions(wrap=exceptions.RemoteFileManagerListError, msg="An error occurred while listing the directory")
+    async def list_files_in_file_store(self, dir_key: str) -> List[str]:
+        """
+        Handles listing the files of a directory in the file store.
+        """
+        return await self.remote_file_service.list_files(dir_key)
+
+    async def register_uploaded_files(self, kb: KnowledgeBaseDocument, file_keys: List[str], user_id: Optional[str] = None) -> List[ResourceDocument]:
+        """
+        Creates resources for files uploaded directly to the file store and adds them to their knowledge base.
+        Files that already have a resource in the knowledge base are skipped, so concurrent or repeated commits register each file once.
+        """
+        if not file_keys:
+            return []
+
+        create_dicts = []
+        for file_key in file_keys:
+            resource_dict = {
+                'name': file_key.rsplit('/', 1)[-1],
+                'knowledgebase_id': kb.id,
+                'knowledgebase_name': kb.name,
+                'visibility': kb.visibility,
+                'remote_file_key': file_key
+            }
+            if user_id:
+                resource_dict['user_id'] = user_id
+            create_dicts.append(resource_dict)
 
+        resources = await self.create_resources(create_dicts, skip_duplicates=True)
+        if resources:
+            await self.add_resources(str(kb.id), resources)
+        return resources
+
+    @translate_exceptions(wrap=exceptions.RemoteFileManagerMoveError, msg="An unknown error occurred while moving the file", passthrough=(exceptions.RemoteFileManagerMoveError,))
+    async def move_file_in_file_store(self, resource: ResourceDocument, new_dir: str) -> ResourceDocument:
+        """
+        Handles file movements between directories, returning the resource with its new file key.
+        """
+        old_key = resource.remote_file_key
+        response = await self.remote_file_service.move_file(old_key, new_dir, resource.name)
+        if not response.success:
+            raise exceptions.RemoteFileManagerMoveError(f"An error occurred while moving the file: {response.message}")
+
+        # The given resource may be the cached instance other requests hold, so it is not mutated.
+        # The new key is written by ID and the updated document comes back from the same round trip.
+        try:
+            return await self.resource_adapter.update_resource(resource.resource_id, {'remote_file_key': response.file_key})
+        finally:
+            resource_cache.invalidate(str(resource.resource_id))
+
+    @translate_exceptions(wrap=exceptions.RemoteFileManagerDeleteError, msg="An unknown error occurred while deleting the file", passthrough=(exceptions.RemoteFileManagerDeleteError,))
     async def delete_file_from_file_store(self, file_key: str) -> None:
         """
         Handles the deletion of files from the file store.
         """
-        try:
-            response = await self.remote_file_service.delete_file(file_key)
-            if not response.success:
-                raise exceptions.RemoteFileManagerDeleteError(f"An error occurred while deleting the file: {response.message}")
-        except exceptions.RemoteFileManagerDeleteError:
-            raise
-        except Exception as e:
-            raise exceptions.RemoteFileManagerDeleteError(f"An unknown error occurred while deleting the file: {str(e)}")
+        response = await self.remote_file_service.delete_file(file_key)
+        if not response.success:
+            raise exceptions.RemoteFileManagerDeleteError(f"An error occurred while deleting the file: {response.message}")
+
+    @translate_exceptions(wrap=exceptions.RemoteFileManagerDeleteError, msg="An unknown error occurred while deleting the files", passthrough=(exceptions.RemoteFileManagerDeleteError,))
+    async def delete_files_from_file_store(self, file_keys: List[str]) -> None:
+        """
+        Handles the deletion of several files from the file store in batched requests.
+        """
+        if not file_keys:
+            return
+        response = await self.remote_file_service.delete_files(file_keys)
+        if not response.success:
+            raise exceptions.RemoteFileManagerDeleteError(f"An error occurred while deleting the files: {response.message}")
 
+    @translate_exceptions(wrap=exceptions.RemoteFileManagerDeleteError, msg="An unknown error occurred while deleting the directory", passthrough=(exceptions.RemoteFileManagerDeleteError,))
     async def delete_directory_from_file_store(self, dir_key: str) -> None:
         """
         Handles the deletion of directories from the file store.
         """
-        try:
-            response = await self.remote_file_service.delete_directory(dir_key)
-            if not response.success:
-                raise exceptions.RemoteFileManagerDeleteError(f"An error occurred while deleting the directory: {response.message}")
-        except exceptions.RemoteFileManagerDeleteError:
-            raise
-        except Exception as e:
-            raise exceptions.RemoteFileManagerDeleteError(f"An unknown error occurred while deleting the directory: {str(e)}")
\ No newline at end of file
+        response = await self.remote_file_service.delete_directory(dir_key)
+        if not response.success:
+            raise exceptions.RemoteFileManagerDeleteError(f"An error occurred while deleting the directory: {response.message}")
@@ -0,0 +1,119 @@
+import asyncio
+import unittest
+
+from app.services.cache import AsyncTTLCache, request_scope
+
+
+class AsyncTTLCacheTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache = AsyncTTLCache(maxsize=16, ttl=60)
+        self.calls = 0
+
+    async def slow_loader(self, value, release: asyncio.Event):
+        self.calls += 1
+        await release.wait()
+        return value
+
+    async def test_concurrent_misses_share_one_load(self):
+        release = asyncio.Event()
+        first = asyncio.create_task(self.cache.get_or_load('kb', lambda: self.slow_loader('v1', release)))
+        second = asyncio.create_task(self.cache.get_or_load('kb', lambda: self.slow_loader('v2', release)))
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await asyncio.gather(first, second), ['v1', 'v1'])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache._locks, {})
+
+    async def test_errors_are_not_cached(self):
+        async def failing_loader():
+            self.calls += 1
+            raise RuntimeError('boom')
+
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                await self.cache.get_or_load('kb', failing_loader)
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.cache._locks, {})
+
+    async def test_waiters_keep_the_lock_after_a_failed_load(self):
+        release = asyncio.Event()
+
+        async def failing_loader():
+            self.calls += 1
+            await release.wait()
+            raise RuntimeError('boom')
+
+        tasks = [asyncio.create_task(self.cache.get_or_load('kb', failing_loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+        key_lock = self.cache._locks['kb']
+        release.set()
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        # Each waiter retried under the same lock, one load at a time
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(key_lock.users, 0)
+        self.assertEqual(self.cache._locks, {})
+
+    async def test_invalidate_during_load_does_not_store_the_stale_value(self):
+        release = asyncio.Event()
+        load = asyncio.create_task(self.cache.get_or_load('kb', lambda: self.slow_loader('stale', release)))
+        await asyncio.sleep(0)
+        self.cache.invalidate('kb')
+        release.set()
+
+        self.assertEqual(await load, 'stale')
+        self.assertNotIn('kb', self.cache._cache)
+
+        release = asyncio.Event()
+        release.set()
+        self.assertEqual(await self.cache.get_or_load('kb', lambda: self.slow_loader('fresh', release)), 'fresh')
+        self.assertEqual(self.calls, 2)
+
+    async def test_invalidating_another_key_still_stores_the_value(self):
+        release = asyncio.Event()
+        load = asyncio.create_task(self.cache.get_or_load('kb', lambda: self.slow_loader('v1', release)))
+        await asyncio.sleep(0)
+        self.cache.invalidate('other')
+        release.set()
+
+        self.assertEqual(await load, 'v1')
+        self.assertEqual(self.cache._cache['kb'], 'v1')
+
+    async def test_fresh_skips_the_shared_cache(self):
+        release = asyncio.Event()
+        release.set()
+        await self.cache.get_or_load('kb', lambda: self.slow_loader('v1', release))
+
+        self.assertEqual(await self.cache.get_or_load('kb', lambda: self.slow_loader('v2', release), fresh=True), 'v2')
+        # The fresh value replaces the shared entry for later reads
+        self.assertEqual(await self.cache.get_or_load('kb', lambda: self.slow_loader('v3', release)), 'v2')
+        self.assertEqual(self.calls, 2)
+
+    async def test_request_scope_returns_the_same_object(self):
+        async def loader():
+            self.calls += 1
+            return object()
+
+        with request_scope():
+            first = await self.cache.get_or_load('kb', loader)
+            # Even once the shared entry is gone, the request keeps seeing its own copy
+            self.cache._cache.clear()
+            self.assertIs(await self.cache.get_or_load('kb', loader), first)
+
+            self.cache.invalidate('kb')
+            second = await self.cache.get_or_load('kb', loader)
+            self.assertIsNot(second, first)
+
+        # A new request starts with an empty map and falls back to the shared cache
+        with request_scope():
+            self.assertIs(await self.cache.get_or_load('kb', loader), second)
+
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import MagicMock
+
+from app.services.file_service import S3_DELETE_BATCH_SIZE, S3Service
+
+
+class S3ServiceDeleteTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.s3_client = MagicMock()
+        self.s3_client.meta.client.delete_objects.return_value = {}
+        self.service = S3Service(self.s3_client, bucket_name='bucket')
+
+    def test_delete_objects_batches_keys(self):
+        keys = [f'kb/file-{i}' for i in range(2 * S3_DELETE_BATCH_SIZE + 1)]
+
+        self.assertEqual(self.service._delete_objects(keys), [])
+
+        calls = self.s3_client.meta.client.delete_objects.call_args_list
+        self.assertEqual([len(call.kwargs['Delete']['Objects']) for call in calls], [S3_DELETE_BATCH_SIZE, S3_DELETE_BATCH_SIZE, 1])
+        self.assertEqual([obj['Key'] for call in calls for obj in call.kwargs['Delete']['Objects']], keys)
+
+    def test_delete_objects_collects_errors_from_every_batch(self):
+        self.s3_client.meta.client.delete_objects.side_effect = [
+            {'Errors': [{'Key': 'kb/a'}]},
+            {'Errors': [{'Key': 'kb/b'}]},
+        ]
+        keys = [f'kb/file-{i}' for i in range(S3_DELETE_BATCH_SIZE + 1)]
+
+        self.assertEqual(self.service._delete_objects(keys), [{'Key': 'kb/a'}, {'Key': 'kb/b'}])
+
+    async def test_delete_files_reports_failed_keys(self):
+        self.s3_client.meta.client.delete_objects.return_value = {'Errors': [{'Key': 'kb/a'}]}
+
+        response = await self.service.delete_files(['kb/a', 'kb/b'])
+
+        self.assertFalse(response.success)
+        self.assertIn('kb/a', response.message)
+
+
+if __name__ == '__main__':
+    unittest.main()
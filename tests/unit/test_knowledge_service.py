@@ -0,0 +1,159 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from app import exceptions
+from app.models import Visibility
+from app.services.knowledge_service import KnowledgeBaseService, _background_tasks, drain_background_tasks, run_in_background, translate_exceptions
+
+
+def make_service() -> KnowledgeBaseService:
+    return KnowledgeBaseService(kb_adapter=AsyncMock(), resource_adapter=AsyncMock(), remote_file_service=AsyncMock())
+
+
+def make_file(filename: str) -> MagicMock:
+    file = MagicMock(filename=filename)
+    file.close = AsyncMock()
+    return file
+
+
+class TranslateExceptionsTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_unknown_errors_are_wrapped_with_the_formatted_message(self):
+        @translate_exceptions(wrap=exceptions.KBException, msg="Failed for {kb_id}")
+        async def fail(kb_id: str) -> None:
+            raise RuntimeError('boom')
+
+        with self.assertRaises(exceptions.KBException) as raised:
+            await fail('kb-1')
+
+        self.assertEqual(str(raised.exception), 'Failed for kb-1: boom')
+        self.assertIsInstance(raised.exception.__cause__, RuntimeError)
+
+    async def test_passthrough_errors_are_raised_unchanged(self):
+        error = exceptions.KnowledgeBaseNotFound('missing')
+
+        @translate_exceptions(wrap=exceptions.KBException, msg="Failed for {kb_id}", passthrough=(exceptions.KnowledgeBaseNotFound,))
+        async def fail(kb_id: str) -> None:
+            raise error
+
+        with self.assertRaises(exceptions.KnowledgeBaseNotFound) as raised:
+            await fail(kb_id='kb-1')
+
+        self.assertIs(raised.exception, error)
+
+    async def test_results_are_returned(self):
+        @translate_exceptions(wrap=exceptions.KBException, msg="Failed")
+        async def succeed(value: int) -> int:
+            return value
+
+        self.assertEqual(await succeed(3), 3)
+
+
+class AddFilesToFilestoreTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.service = make_service()
+        self.files = [make_file('a.txt'), make_file('b.txt'), make_file('c.txt')]
+        self.resources = [SimpleNamespace(resource_id=f'res-{i}', remote_file_key=None) for i in range(3)]
+        self.service.resource_adapter.bulk_create.return_value = self.resources
+
+    async def add_files(self):
+        return await self.service.add_files_to_filestore('user-1', 'kb-dir', 'kb-1', 'KB', self.files, Visibility.PRIVATE)
+
+    async def test_failed_uploads_are_cleaned_up(self):
+        self.service.remote_file_service.upload_file.side_effect = [
+            SimpleNamespace(success=True, file_key='kb-dir/a.txt', message=''),
+            SimpleNamespace(success=False, file_key=None, message='rejected'),
+            RuntimeError('connection reset'),
+        ]
+
+        summary = await self.add_files()
+
+        self.assertEqual([success.filename for success in summary.successes], ['a.txt'])
+        self.assertEqual([(error.filename, error.error_message) for error in summary.errors], [('b.txt', 'rejected'), ('c.txt', 'connection reset')])
+        self.service.resource_adapter.bulk_update.assert_awaited_once_with({'res-0': {'remote_file_key': 'kb-dir/a.txt'}})
+        self.service.resource_adapter.delete_many.assert_awaited_once_with(['res-1', 'res-2'])
+        self.service.kb_adapter.add_resources.assert_awaited_once_with('kb-1', [self.resources[0]])
+        self.service.remote_file_service.delete_files.assert_not_awaited()
+        for file in self.files:
+            file.close.assert_awaited_once()
+
+    async def test_files_are_removed_when_their_keys_cannot_be_saved(self):
+        self.service.remote_file_service.upload_file.side_effect = [
+            SimpleNamespace(success=True, file_key=f'kb-dir/{file.filename}', message='') for file in self.files
+        ]
+        self.service.resource_adapter.bulk_update.side_effect = exceptions.CannotUpdateResource('write failed')
+        self.service.remote_file_service.delete_files.return_value = SimpleNamespace(success=True, message='')
+
+        summary = await self.add_files()
+        await drain_background_tasks()
+
+        self.assertEqual(summary.successes, [])
+        self.assertEqual(len(summary.errors), 3)
+        self.service.remote_file_service.delete_files.assert_awaited_once_with(['kb-dir/a.txt', 'kb-dir/b.txt', 'kb-dir/c.txt'])
+        self.service.resource_adapter.delete_many.assert_awaited_once_with(['res-0', 'res-1', 'res-2'])
+        self.service.kb_adapter.add_resources.assert_not_awaited()
+
+
+class DeleteResourcesTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.service = make_service()
+
+    async def test_deleted_resources_are_pulled_from_knowledge_bases(self):
+        self.service.resource_adapter.delete_many.return_value = 2
+
+        await self.service.delete_resources(['a', 'b', 'a'], knowledgebase_ids=['kb-1'])
+
+        self.service.resource_adapter.delete_many.assert_awaited_once_with(['a', 'b'])
+        self.service.kb_adapter.remove_resources_from_all.assert_awaited_once_with(['a', 'b'])
+        self.service.resource_adapter.get_existing_ids.assert_not_awaited()
+
+    async def test_partial_delete_only_pulls_the_deleted_resources(self):
+        self.service.resource_adapter.delete_many.return_value = 1
+        self.service.resource_adapter.get_existing_ids.return_value = {'b'}
+
+        with self.assertRaises(exceptions.CannotDeleteResource):
+            await self.service.delete_resources(['a', 'b'])
+
+        self.service.kb_adapter.remove_resources_from_all.assert_awaited_once_with(['a'])
+
+    async def test_failed_delete_leaves_knowledge_bases_untouched(self):
+        self.service.resource_adapter.delete_many.side_effect = RuntimeError('timeout')
+
+        with self.assertRaises(exceptions.ResourceException):
+            await self.service.delete_resources(['a'])
+
+        self.service.kb_adapter.remove_resources_from_all.assert_not_awaited()
+
+
+class BackgroundTaskTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_drain_waits_for_every_task(self):
+        finished = []
+
+        async def work(name: str) -> None:
+            await asyncio.sleep(0)
+            finished.append(name)
+
+        async def fail() -> None:
+            raise RuntimeError('boom')
+
+        run_in_background(work('first'))
+        run_in_background(fail())
+        run_in_background(work('second'))
+        self.assertEqual(len(_background_tasks), 3)
+
+        # A failing task does not stop the others from being awaited
+        await drain_background_tasks()
+        # Done callbacks run on the next loop iteration
+        await asyncio.sleep(0)
+
+        self.assertEqual(sorted(finished), ['first', 'second'])
+        self.assertEqual(len(_background_tasks), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()